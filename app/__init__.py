@@ -13,8 +13,23 @@ from flask_dance.contrib.discord import make_discord_blueprint
 from flask_dance.contrib.google import make_google_blueprint
 from flask_login import current_user, login_user
 
-from .extensions import db, login_manager, migrate
+from .extensions import db, init_sqlite, login_manager, migrate
 from .models import OAuth, User
+from .utilities.pagination import page_url
+from .utilities.imports import init_imports
+from .utilities.metrics import init_metrics
+from .utilities.page_cache import init_page_cache
+from .utilities.query_budget import init_query_budget
+from .utilities.search import include_object, init_search
+from .utilities.stats import init_stats
+from .utilities.timing import init_timing, timed
+from .utilities.user_cache import init_user_cache, load_cached_user
+from .utilities.webhooks import init_webhooks
+
+
+@timed("http")
+def _fetch_profile(blueprint, path):
+    return blueprint.session.get(path)
 
 
 def create_app():
@@ -24,13 +39,24 @@ def create_app():
     app.config.setdefault("PREFERRED_URL_SCHEME", "https")
 
     db.init_app(app)
-    migrate.init_app(app, db)
+    init_sqlite(app)
+    migrate.init_app(app, db, include_object=include_object)
     login_manager.init_app(app)
     login_manager.login_view = "main.login"
+    init_timing(app)
+    init_metrics(app)
+    init_query_budget(app)
+    init_search(app)
+    init_page_cache(app)
+    init_user_cache(app)
+    init_stats(app)
+    init_webhooks(app)
+    init_imports(app)
+    app.add_template_global(page_url)
 
     @login_manager.user_loader
     def load_user(user_id):
-        return User.query.get(int(user_id))
+        return load_cached_user(user_id)
 
     from .blueprints.main import main_bp
     from .blueprints.notes import notes_bp
@@ -40,6 +66,10 @@ def create_app():
     app.register_blueprint(notes_bp, url_prefix="/notes")
     app.register_blueprint(admin_bp, url_prefix="/admin")
 
+    from .commands import register_commands
+
+    register_commands(app)
+
     google_bp = make_google_blueprint(
         client_id=app.config["GOOGLE_CLIENT_ID"],
         client_secret=app.config["GOOGLE_CLIENT_SECRET"],
@@ -122,7 +152,7 @@ def create_app():
         if not token:
             return False
 
-        resp = blueprint.session.get("/oauth2/v2/userinfo")
+        resp = _fetch_profile(blueprint, "/oauth2/v2/userinfo")
         if not resp.ok:
             return False
 
@@ -149,7 +179,7 @@ def create_app():
         if not token:
             return False
 
-        resp = blueprint.session.get("/api/users/@me")
+        resp = _fetch_profile(blueprint, "/api/users/@me")
         if not resp.ok:
             return False
 
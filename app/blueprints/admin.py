@@ -1,25 +1,28 @@
 from flask import (
     Blueprint,
     abort,
-    after_this_request,
     flash,
     redirect,
     render_template,
     request,
-    send_file,
+    stream_with_context,
     url_for,
     current_app,
 )
 from flask_login import current_user, login_required
 from functools import wraps
-import os
-import sqlite3
-import tempfile
 from datetime import datetime
-from sqlalchemy.engine import make_url
+from sqlalchemy import select
 
+from app.blueprints.notes import filtered_notes_query
 from app.extensions import db
-from app.models import Note, NoteType, Subject, User
+from app.models import ImportJob, Note, NoteType, Subject, User
+from app.utilities import reference_data
+from app.utilities.export import gzip_stream, ndjson_dump_chunks
+from app.utilities.pagination import paginate_notes
+from app.utilities.search import reindex_notes, unindex_notes
+from app.utilities.stats import STATS, count_bulk_note_change, dashboard_stats
+from app.utilities.storage import queue_s3_deletes, release_objects
 
 admin_bp = Blueprint("admin", __name__)
 
@@ -38,17 +41,28 @@ def admin_required(f):
 @admin_bp.route("/")
 @admin_required
 def dashboard():
-    users_count = User.query.count()
-    notes_count = Note.query.count()
-    subjects_count = Subject.query.count()
-    note_types_count = NoteType.query.count()
+    stats = dashboard_stats()
+    totals = stats["totals"]
+    subject_names = {s.id: s.name for s in reference_data.subjects()}
+    note_type_names = {t.id: t.name for t in reference_data.note_types()}
+
+    def _named(counts, names):
+        return sorted(
+            ((names[id], count) for id, count in counts.items() if id in names),
+            key=lambda item: item[1],
+            reverse=True,
+        )
 
     return render_template(
         "admin/dashboard.html",
-        users_count=users_count,
-        notes_count=notes_count,
-        subjects_count=subjects_count,
-        note_types_count=note_types_count,
+        users_count=totals["users"],
+        notes_count=totals["notes"],
+        subjects_count=totals["subjects"],
+        note_types_count=totals["note_types"],
+        notes_by_subject=_named(stats["by_subject"], subject_names),
+        notes_by_note_type=_named(stats["by_note_type"], note_type_names),
+        top_uploaders=stats["top_uploaders"],
+        uploads_per_day=stats["per_day"],
     )
 
 
@@ -87,6 +101,7 @@ def add_subject():
             subject = Subject(name=name)
             db.session.add(subject)
             db.session.commit()
+            reference_data.invalidate_reference_data()
         else:
             pass
     return redirect(url_for("admin.subjects"))
@@ -106,6 +121,7 @@ def update_subject(id):
 
     subject.name = name
     db.session.commit()
+    reference_data.invalidate_reference_data()
     return redirect(url_for("admin.subjects"))
 
 
@@ -115,6 +131,7 @@ def delete_subject(id):
     subject = Subject.query.get_or_404(id)
     db.session.delete(subject)
     db.session.commit()
+    reference_data.invalidate_reference_data()
     return redirect(url_for("admin.subjects"))
 
 
@@ -135,6 +152,7 @@ def add_note_type():
             note_type = NoteType(name=name)
             db.session.add(note_type)
             db.session.commit()
+            reference_data.invalidate_reference_data()
         else:
             pass
     return redirect(url_for("admin.note_types"))
@@ -154,6 +172,7 @@ def update_note_type(id):
 
     note_type.name = name
     db.session.commit()
+    reference_data.invalidate_reference_data()
     return redirect(url_for("admin.note_types"))
 
 
@@ -163,25 +182,148 @@ def delete_note_type(id):
     note_type = NoteType.query.get_or_404(id)
     db.session.delete(note_type)
     db.session.commit()
+    reference_data.invalidate_reference_data()
     return redirect(url_for("admin.note_types"))
 
 
+def _note_filters():
+    return {
+        "search": request.args.get("search", "").strip(),
+        "subject_id": request.args.get("subject"),
+        "note_type_id": request.args.get("note_type"),
+        "user_id": request.args.get("user"),
+    }
+
+
+def _notes_url():
+    # Bulk and edit forms post to URLs carrying the listing's filters and
+    # cursor, so they can send the admin back to the same page.
+    return url_for("admin.notes", **request.args.to_dict())
+
+
 @admin_bp.route("/notes")
 @admin_required
 def notes():
-    notes = Note.query.order_by(Note.created_at.desc()).all()
-    subjects = Subject.query.order_by(Subject.name.asc()).all()
-    note_types = NoteType.query.order_by(NoteType.name.asc()).all()
+    filters = _note_filters()
+    query, _ = filtered_notes_query(sort="newest", **filters)
+    page = paginate_notes(
+        query,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=current_app.config["ADMIN_NOTES_PER_PAGE"],
+    )
+    uploaders = (
+        User.query.with_entities(User.id, User.name)
+        .filter(User.notes.any())
+        .order_by(User.name.asc())
+        .all()
+    )
     return render_template(
-        "admin/notes.html", notes=notes, subjects=subjects, note_types=note_types
+        "admin/notes.html",
+        notes=page.items,
+        page=page,
+        subjects=reference_data.subjects(),
+        note_types=reference_data.note_types(),
+        uploaders=uploaders,
+        search=filters["search"],
+        selected_subject=filters["subject_id"],
+        selected_note_type=filters["note_type_id"],
+        selected_user=filters["user_id"],
+    )
+
+
+def _delete_notes(criterion, unindex):
+    """Delete every note matching ``criterion`` with set-based statements.
+
+    ``unindex`` is ``(column, values)`` for the search index. Returns the
+    number of notes deleted; their S3 objects are removed in the background.
+    """
+    links = [link for (link,) in db.session.query(Note.link).filter(criterion)]
+    unused_keys = release_objects(links)
+    unindex_notes(*unindex)
+    ImportJob.query.filter(
+        ImportJob.note_id.in_(select(Note.id).where(criterion))
+    ).delete(synchronize_session=False)
+    count_bulk_note_change(criterion)
+    deleted = (
+        Note.query.filter(criterion)
+        .execution_options(changes_counted=(STATS,))
+        .delete(synchronize_session=False)
     )
+    db.session.commit()
+    queue_s3_deletes(unused_keys)
+    return deleted
 
 
-@admin_bp.route("/notes/update/<int:id>", methods=["POST"])
+def _reassign_notes(note_ids, values):
+    criterion = Note.id.in_(note_ids)
+    count_bulk_note_change(criterion, values)
+    updated = (
+        Note.query.filter(criterion)
+        .execution_options(changes_counted=(STATS,))
+        .update(values, synchronize_session=False)
+    )
+    reindex_notes("id", note_ids)
+    db.session.commit()
+    return updated
+
+
+@admin_bp.route("/notes/bulk", methods=["POST"])
+@admin_required
+def bulk_notes():
+    action = request.form.get("action")
+    note_ids = request.form.getlist("note_ids", type=int)
+
+    if action == "delete_uploader":
+        user = db.session.get(User, request.form.get("user_id", type=int) or 0)
+        if not user:
+            flash("Choose an uploader to delete notes for.", "error")
+            return redirect(_notes_url())
+        deleted = _delete_notes(Note.user_id == user.id, ("user_id", [user.id]))
+        flash(f"Deleted {deleted} note(s) uploaded by {user.name}.", "info")
+        return redirect(_notes_url())
+
+    if not note_ids:
+        flash("Select at least one note.", "error")
+        return redirect(_notes_url())
+
+    if action == "delete":
+        deleted = _delete_notes(Note.id.in_(note_ids), ("id", note_ids))
+        flash(f"Deleted {deleted} note(s).", "info")
+    elif action == "subject":
+        subject = reference_data.get_subject(request.form.get("subject_id"))
+        if not subject:
+            flash("Choose a subject to move the notes to.", "error")
+            return redirect(_notes_url())
+        updated = _reassign_notes(note_ids, {Note.subject_id: subject.id})
+        flash(f"Moved {updated} note(s) to {subject.name}.", "info")
+    elif action == "note_type":
+        note_type = reference_data.get_note_type(request.form.get("note_type_id"))
+        if not note_type:
+            flash("Choose a note type to move the notes to.", "error")
+            return redirect(_notes_url())
+        updated = _reassign_notes(note_ids, {Note.note_type_id: note_type.id})
+        flash(f"Changed {updated} note(s) to {note_type.name}.", "info")
+    else:
+        abort(400)
+
+    return redirect(_notes_url())
+
+
+@admin_bp.route("/notes/update/<int:id>", methods=["GET", "POST"])
 @admin_required
 def update_note(id):
     note = Note.query.get_or_404(id)
 
+    if request.method == "GET":
+        return render_template(
+            "admin/note_edit.html",
+            note=note,
+            subjects=reference_data.subjects(),
+            note_types=reference_data.note_types(),
+            back_url=_notes_url(),
+        )
+
     title = request.form.get("title", "").strip()
     description = request.form.get("description", "").strip()
     subject_id = request.form.get("subject_id")
@@ -189,12 +331,12 @@ def update_note(id):
     link = request.form.get("link", "").strip()
 
     if not title or not subject_id or not note_type_id:
-        return redirect(url_for("admin.notes"))
+        return redirect(_notes_url())
 
-    subject = Subject.query.get(subject_id)
-    note_type = NoteType.query.get(note_type_id)
+    subject = reference_data.get_subject(subject_id)
+    note_type = reference_data.get_note_type(note_type_id)
     if not subject or not note_type:
-        return redirect(url_for("admin.notes"))
+        return redirect(_notes_url())
 
     note.title = title
     note.description = description or None
@@ -206,16 +348,18 @@ def update_note(id):
         note.original_link = link
 
     db.session.commit()
-    return redirect(url_for("admin.notes"))
+    return redirect(_notes_url())
 
 
 @admin_bp.route("/notes/delete/<int:id>", methods=["POST"])
 @admin_required
 def delete_note(id):
     note = Note.query.get_or_404(id)
+    unused_keys = release_objects([note.link])
     db.session.delete(note)
     db.session.commit()
-    return redirect(url_for("admin.notes"))
+    queue_s3_deletes(unused_keys)
+    return redirect(_notes_url())
 
 
 @admin_bp.route("/users")
@@ -240,43 +384,15 @@ def toggle_admin(id):
 @admin_bp.route("/export-db")
 @admin_required
 def export_db():
-    uri = current_app.config.get("SQLALCHEMY_DATABASE_URI", "")
-    try:
-        parsed = make_url(uri)
-    except Exception:
-        abort(400, "Invalid database URL.")
-
-    if parsed.drivername != "sqlite":
-        abort(400, "Export endpoint only supports SQLite source databases.")
-
-    if not parsed.database or parsed.database == ":memory:":
-        abort(400, "In-memory SQLite database cannot be exported.")
-
-    db_path = parsed.database
-    if not os.path.isabs(db_path):
-        db_path = os.path.abspath(db_path)
-
-    if not os.path.exists(db_path):
-        abort(404, "Database file not found.")
-
-    fd, backup_path = tempfile.mkstemp(prefix="porahobe_backup_", suffix=".db")
-    os.close(fd)
-
-    src = sqlite3.connect(db_path)
-    dst = sqlite3.connect(backup_path)
-    try:
-        src.backup(dst)
-    finally:
-        src.close()
-        dst.close()
-
-    @after_this_request
-    def _cleanup(response):
-        try:
-            os.remove(backup_path)
-        except OSError:
-            pass
-        return response
+    # A logical dump for every backend, in constant memory and disk space.
+    chunks = stream_with_context(
+        ndjson_dump_chunks(current_app.config["EXPORT_BATCH_SIZE"])
+    )
+    stamp = datetime.utcnow().strftime("%Y%m%d_%H%M%S")
+    filename = f"porahobe_backup_{stamp}.ndjson.gz"
 
-    filename = f"porahobe_backup_{datetime.utcnow().strftime('%Y%m%d_%H%M%S')}.db"
-    return send_file(backup_path, as_attachment=True, download_name=filename)
+    return current_app.response_class(
+        gzip_stream(chunks),
+        mimetype="application/gzip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
@@ -1,11 +1,25 @@
+import hmac
 from pathlib import Path
 
-from flask import Blueprint, redirect, render_template, send_from_directory, url_for
+from flask import (
+    Blueprint,
+    Response,
+    abort,
+    current_app,
+    redirect,
+    render_template,
+    request,
+    send_from_directory,
+    url_for,
+)
 from flask_login import current_user, login_required, logout_user
 from flask_dance.contrib.discord import discord
 from flask_dance.contrib.google import google
+from sqlalchemy.orm import joinedload
 
 from app.models import Note
+from app.utilities.metrics import render_metrics
+from app.utilities.timing import timed
 
 main_bp = Blueprint("main", __name__)
 FAVICON_DIR = Path(__file__).resolve().parents[2] / "favicon"
@@ -26,6 +40,7 @@ def login():
 @main_bp.route("/profile")
 @login_required
 def profile():
+    @timed("http")
     def _safe_json(client, endpoint):
         if not client.authorized:
             return None
@@ -40,6 +55,7 @@ def profile():
     total_uploads = Note.query.filter_by(user_id=current_user.id).count()
     recent_uploads = (
         Note.query.filter_by(user_id=current_user.id)
+        .options(joinedload(Note.subject))
         .order_by(Note.created_at.desc())
         .limit(5)
         .all()
@@ -71,3 +87,19 @@ def favicon_files(filename):
 @main_bp.route("/favicon.ico")
 def favicon():
     return send_from_directory(FAVICON_DIR, "favicon.ico")
+
+
+@main_bp.route("/metrics")
+def metrics():
+    path = current_app.config["METRICS_DB_PATH"]
+    if not path:
+        abort(404)
+
+    token = current_app.config["METRICS_TOKEN"]
+    authorization = request.headers.get("Authorization", "")
+    if token and not hmac.compare_digest(authorization, f"Bearer {token}"):
+        abort(401)
+
+    return Response(
+        render_metrics(path), content_type="text/plain; version=0.0.4; charset=utf-8"
+    )
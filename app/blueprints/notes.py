@@ -1,5 +1,8 @@
 from flask import (
     Blueprint,
+    abort,
+    flash,
+    jsonify,
     redirect,
     render_template,
     request,
@@ -8,15 +11,36 @@ from flask import (
 )
 from flask_login import current_user, login_required
 from werkzeug.utils import secure_filename
-from sqlalchemy import or_
-import requests
+from sqlalchemy.orm import joinedload
 import os
 import re
 from urllib.parse import parse_qs, quote_plus, urlparse
 
 from app.extensions import db
-from app.models import Note, NoteType, Subject
-from app.utilities.s3 import upload_to_s3, generate_presigned_url
+from app.models import ImportJob, Note
+from app.utilities import reference_data
+from app.utilities.imports import (
+    enqueue_drive_import,
+    is_drive_link,
+    job_status,
+    wake_import_worker,
+)
+from app.utilities.page_cache import cached_page
+from app.utilities.pagination import paginate_notes
+from app.utilities.query_budget import query_budget
+from app.utilities.s3 import generate_presigned_url, generate_presigned_urls
+from app.utilities.search import apply_search
+from app.utilities.stats import uploader_note_count
+from app.utilities.storage import (
+    ContentReleased,
+    queue_s3_deletes,
+    release_objects,
+    retain_object,
+    store_file,
+    store_files,
+)
+from app.utilities.thumbnails import queue_thumbnails
+from app.utilities.webhooks import enqueue_embeds
 
 notes_bp = Blueprint("notes", __name__)
 
@@ -110,7 +134,7 @@ def _build_preview_data(note):
 
     ext = _extract_extension(note.link)
     file_url = note.presigned_url
-    filename = os.path.basename(note.link or "")
+    filename = note.filename or os.path.basename(note.link or "")
 
     if ext in IMAGE_EXTENSIONS:
         kind = "image"
@@ -128,6 +152,8 @@ def _build_preview_data(note):
         kind = "download"
 
     data = {"kind": kind, "url": file_url, "filename": filename, "ext": ext}
+    if kind == "image":
+        data["display_url"] = note.preview_url or file_url
     if kind == "document":
         data["viewer_url"] = (
             f"https://docs.google.com/gview?embedded=1&url={quote_plus(file_url)}"
@@ -135,8 +161,63 @@ def _build_preview_data(note):
     return data
 
 
+def _attach_presigned_urls(notes):
+    urls = generate_presigned_urls(
+        [note.link for note in notes if note.link and not note.original_link]
+        + [note.thumbnail_key for note in notes if note.thumbnail_key]
+    )
+    for note in notes:
+        if note.link and not note.original_link:
+            note.presigned_url = urls[note.link]
+        else:
+            note.presigned_url = note.link
+        note.thumbnail_url = urls.get(note.thumbnail_key)
+
+
+def filtered_notes_query(search, subject_id, note_type_id, user_id, sort):
+    query = Note.query.options(
+        joinedload(Note.user), joinedload(Note.subject), joinedload(Note.note_type)
+    )
+
+    if subject_id:
+        query = query.filter(Note.subject_id == subject_id)
+
+    if note_type_id:
+        query = query.filter(Note.note_type_id == note_type_id)
+
+    if user_id:
+        query = query.filter(Note.user_id == user_id)
+
+    search_key = None
+    if search:
+        query, search_key = apply_search(query, search, ranked=sort == "relevance")
+
+    return query, search_key
+
+
+def _store_and_retain(uploads):
+    """Upload ``(file, filename)`` pairs, then count a reference to each.
+
+    Returns the key each note links to. Nothing is written to the database
+    until every upload has finished, so no write lock is held across S3 calls.
+    """
+    stored_files = store_files(uploads)
+    try:
+        return [retain_object(stored) for stored in stored_files]
+    except ContentReleased:
+        # An object we matched lost its last reference meanwhile. Roll back
+        # before uploading our own copies, then count them again.
+        db.session.rollback()
+        stored_files = [
+            stored if stored.uploaded else store_file(file, filename, reuse=False)
+            for (file, filename), stored in zip(uploads, stored_files)
+        ]
+        return [retain_object(stored) for stored in stored_files]
+
+
 @notes_bp.route("/upload", methods=["GET", "POST"])
 @login_required
+@query_budget(100)
 def upload():
     if request.method == "POST":
         subject_id = request.form.get("subject")
@@ -153,46 +234,59 @@ def upload():
         if not title:
             return redirect(url_for("notes.upload"))
 
-        subject = Subject.query.get(subject_id)
+        subject = reference_data.get_subject(subject_id)
         if not subject:
             return redirect(url_for("notes.upload"))
 
-        note_type_obj = NoteType.query.filter_by(name=note_type).first()
-        if not note_type_obj:
-            note_type_obj = NoteType(name=note_type)
-            db.session.add(note_type_obj)
-            db.session.flush()
-
         created_notes = []
+        queued_imports = False
 
         if note_type == "file":
             files = request.files.getlist("files")
             if not files[0].filename:
                 return redirect(url_for("notes.upload"))
 
-            for idx, file in enumerate(files):
-                if file.filename:
-                    filename = secure_filename(file.filename)
-                    s3_key = upload_to_s3(file, filename)
-
-                    note_title = f"{title} - {idx + 1}" if len(files) > 1 else title
-
-                    note = Note(
-                        title=note_title,
-                        description=description,
-                        link=s3_key,
-                        original_link=None,
-                        note_type_id=note_type_obj.id,
-                        subject_id=subject.id,
-                        user_id=current_user.id,
-                    )
-                    db.session.add(note)
-                    created_notes.append(note)
+            uploads = [
+                (idx, file, secure_filename(file.filename))
+                for idx, file in enumerate(files)
+                if file.filename
+            ]
+            try:
+                keys = _store_and_retain(
+                    [(file, filename) for _, file, filename in uploads]
+                )
+            except Exception as e:
+                db.session.rollback()
+                current_app.logger.error(f"Failed to upload files to S3: {e}")
+                flash("Upload failed, nothing was saved. Please try again.", "error")
+                return redirect(url_for("notes.upload"))
+
+            note_type_obj, created_type = reference_data.get_or_create_note_type(
+                note_type
+            )
+            for (idx, _, filename), key in zip(uploads, keys):
+                note_title = f"{title} - {idx + 1}" if len(files) > 1 else title
+
+                note = Note(
+                    title=note_title,
+                    description=description,
+                    link=key,
+                    original_link=None,
+                    filename=filename,
+                    note_type_id=note_type_obj.id,
+                    subject_id=subject.id,
+                    user_id=current_user.id,
+                )
+                db.session.add(note)
+                created_notes.append(note)
         else:
             links = request.form.get("links", "").strip()
             if not links:
                 return redirect(url_for("notes.upload"))
 
+            note_type_obj, created_type = reference_data.get_or_create_note_type(
+                note_type
+            )
             link_list = [l.strip() for l in links.split("\n") if l.strip()]
             for idx, link in enumerate(link_list):
                 note_title = f"{title} - {idx + 1}" if len(link_list) > 1 else title
@@ -208,52 +302,49 @@ def upload():
                 )
                 db.session.add(note)
                 created_notes.append(note)
+                if is_drive_link(link):
+                    enqueue_drive_import(note)
+                    queued_imports = True
 
         db.session.commit()
+        if created_type:
+            reference_data.invalidate_reference_data()
+        queue_thumbnails(created_notes)
+        if queued_imports:
+            wake_import_worker()
 
         webhook_url = current_app.config.get("DISCORD_WEBHOOK_URL")
         if webhook_url:
-            for note in created_notes:
-                try:
-                    note_url = url_for("notes.preview", id=note.id, _external=True)
-                    payload = {
-                        "embeds": [
-                            {
-                                "title": "New Note",
-                                "url": note_url,
-                                "color": 5814783,
-                                "fields": [
-                                    {
-                                        "name": "Title",
-                                        "value": note.title,
-                                        "inline": True,
-                                    },
-                                    {
-                                        "name": "Subject",
-                                        "value": note.subject.name,
-                                        "inline": False,
-                                    },
-                                    {
-                                        "name": "Uploaded By",
-                                        "value": note.user.name,
-                                        "inline": False,
-                                    },
-                                ],
-                            }
-                        ]
-                    }
-                    requests.post(webhook_url, json=payload, timeout=5)
-                except Exception as e:
-                    current_app.logger.error(f"Failed to send Discord webhook: {e}")
+            embeds = [
+                {
+                    "title": "New Note",
+                    "url": url_for("notes.preview", id=note.id, _external=True),
+                    "color": 5814783,
+                    "fields": [
+                        {"name": "Title", "value": note.title, "inline": True},
+                        {"name": "Subject", "value": subject.name, "inline": False},
+                        {
+                            "name": "Uploaded By",
+                            "value": current_user.name,
+                            "inline": False,
+                        },
+                    ],
+                }
+                for note in created_notes
+            ]
+            try:
+                enqueue_embeds(webhook_url, embeds)
+            except Exception as e:
+                current_app.logger.error(f"Failed to queue Discord webhook: {e}")
 
         return redirect(url_for("notes.list"))
 
-    subjects = Subject.query.all()
-    return render_template("upload.html", subjects=subjects)
+    return render_template("upload.html", subjects=reference_data.subjects())
 
 
 @notes_bp.route("/list")
 @login_required
+@cached_page
 def list():
     search = request.args.get("search", "").strip()
     subject_id = request.args.get("subject")
@@ -261,45 +352,28 @@ def list():
     user_id = request.args.get("user")
     sort = request.args.get("sort", "newest")
 
-    query = Note.query
-
-    if search:
-        query = query.filter(
-            or_(Note.title.ilike(f"%{search}%"), Note.description.ilike(f"%{search}%"))
-        )
-
-    if subject_id:
-        query = query.filter_by(subject_id=subject_id)
-
-    if note_type_id:
-        query = query.filter_by(note_type_id=note_type_id)
-
-    if user_id:
-        query = query.filter_by(user_id=user_id)
-
-    if sort == "oldest":
-        query = query.order_by(Note.created_at.asc())
-    elif sort == "title":
-        query = query.order_by(Note.title.asc())
-    else:
-        query = query.order_by(Note.created_at.desc())
-
-    notes = query.all()
+    query, search_key = filtered_notes_query(
+        search, subject_id, note_type_id, user_id, sort
+    )
 
-    for note in notes:
-        if note.link and not note.original_link:
-            note.presigned_url = generate_presigned_url(note.link)
-        else:
-            note.presigned_url = note.link
+    page = paginate_notes(
+        query,
+        sort=sort,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=current_app.config["NOTES_PER_PAGE"],
+        key=search_key,
+    )
+    notes = page.items
 
-    subjects = Subject.query.all()
-    note_types = NoteType.query.all()
+    _attach_presigned_urls(notes)
 
     return render_template(
         "notes_list.html",
         notes=notes,
-        subjects=subjects,
-        note_types=note_types,
+        page=page,
+        subjects=reference_data.subjects(),
+        note_types=reference_data.note_types(),
         search=search,
         selected_subject=subject_id,
         selected_note_type=note_type_id,
@@ -310,6 +384,7 @@ def list():
 
 @notes_bp.route("/preview/<int:id>")
 @login_required
+@cached_page
 def preview(id):
     note = Note.query.get_or_404(id)
 
@@ -317,6 +392,11 @@ def preview(id):
         note.presigned_url = generate_presigned_url(note.link, expiration=3600)
     else:
         note.presigned_url = note.link
+    note.preview_url = (
+        generate_presigned_url(note.preview_key, expiration=3600)
+        if note.preview_key
+        else None
+    )
 
     preview_data = _build_preview_data(note)
     return render_template("note_preview.html", note=note, preview=preview_data)
@@ -348,15 +428,13 @@ def edit(id):
         if not subject_id or not note_type_name or not title:
             return redirect(url_for("notes.edit", id=note.id))
 
-        subject = Subject.query.get(subject_id)
+        subject = reference_data.get_subject(subject_id)
         if not subject:
             return redirect(url_for("notes.edit", id=note.id))
 
-        note_type_obj = NoteType.query.filter_by(name=note_type_name).first()
-        if not note_type_obj:
-            note_type_obj = NoteType(name=note_type_name)
-            db.session.add(note_type_obj)
-            db.session.flush()
+        note_type_obj, created_type = reference_data.get_or_create_note_type(
+            note_type_name
+        )
 
         note.title = title
         note.description = description or None
@@ -368,34 +446,40 @@ def edit(id):
             note.original_link = external_link
 
         db.session.commit()
+        if created_type:
+            reference_data.invalidate_reference_data()
         return redirect(url_for("notes.preview", id=note.id))
 
-    subjects = Subject.query.order_by(Subject.name.asc()).all()
-    note_types = NoteType.query.order_by(NoteType.name.asc()).all()
     return render_template(
         "note_edit.html",
         note=note,
-        subjects=subjects,
-        note_types=note_types,
+        subjects=reference_data.subjects(),
+        note_types=reference_data.note_types(),
     )
 
 
 @notes_bp.route("/my-notes")
 @login_required
 def my_notes():
-    notes = (
-        Note.query.filter_by(user_id=current_user.id)
-        .order_by(Note.created_at.desc())
-        .all()
+    query = Note.query.filter_by(user_id=current_user.id).options(
+        joinedload(Note.subject), joinedload(Note.note_type)
+    )
+    page = paginate_notes(
+        query,
+        after=request.args.get("after"),
+        before=request.args.get("before"),
+        per_page=current_app.config["NOTES_PER_PAGE"],
     )
+    notes = page.items
 
-    for note in notes:
-        if note.link and not note.original_link:
-            note.presigned_url = generate_presigned_url(note.link)
-        else:
-            note.presigned_url = note.link
+    _attach_presigned_urls(notes)
 
-    return render_template("my_notes.html", notes=notes)
+    return render_template(
+        "my_notes.html",
+        notes=notes,
+        page=page,
+        total_notes=uploader_note_count(current_user.id),
+    )
 
 
 @notes_bp.route("/delete/<int:id>", methods=["POST"])
@@ -406,13 +490,42 @@ def delete(id):
     if note.user_id != current_user.id:
         return redirect(url_for("notes.my_notes"))
 
+    unused_keys = release_objects([note.link])
     db.session.delete(note)
     db.session.commit()
+    queue_s3_deletes(unused_keys)
     return redirect(url_for("notes.my_notes"))
 
 
 @notes_bp.route("/activity")
 @login_required
+@cached_page
 def activity():
-    recent_notes = Note.query.order_by(Note.created_at.desc()).limit(20).all()
+    recent_notes = (
+        Note.query.options(joinedload(Note.user), joinedload(Note.subject))
+        .order_by(Note.created_at.desc())
+        .limit(20)
+        .all()
+    )
     return render_template("activity.html", recent_notes=recent_notes)
+
+
+@notes_bp.route("/imports")
+@login_required
+def imports():
+    jobs = (
+        ImportJob.query.filter_by(user_id=current_user.id)
+        .order_by(ImportJob.id.desc())
+        .limit(50)
+        .all()
+    )
+    return jsonify(jobs=[job_status(job) for job in jobs])
+
+
+@notes_bp.route("/imports/<int:id>")
+@login_required
+def import_status(id):
+    job = ImportJob.query.get_or_404(id)
+    if job.user_id != current_user.id and not current_user.is_admin:
+        abort(404)
+    return jsonify(job_status(job))
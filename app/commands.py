@@ -0,0 +1,259 @@
+import gzip
+
+import click
+from flask import current_app
+from flask.cli import AppGroup
+from flask_migrate.cli import db as db_cli
+from sqlalchemy import text
+from sqlalchemy.orm import joinedload
+
+from app.extensions import db
+from app.models import Note, OAuth
+from app.utilities.export import restore_ndjson
+from app.utilities.imports import run_pending_imports
+from app.utilities.manifest_import import ManifestError, import_manifest
+from app.utilities.pagination import keyset_query
+from app.utilities.search import ensure_search_index
+from app.utilities.stats import reconcile_stats
+from app.utilities.storage import sweep_orphaned_objects
+from app.utilities.thumbnails import RASTER_EXTENSIONS, generate_thumbnails
+
+search_cli = AppGroup("search", help="Full-text search index commands.")
+queries_cli = AppGroup("queries", help="Inspect the SQL behind the listing routes.")
+imports_cli = AppGroup("imports", help="Background Drive link imports.")
+thumbnails_cli = AppGroup("thumbnails", help="WebP thumbnails for image notes.")
+stats_cli = AppGroup("stats", help="Admin dashboard statistics.")
+storage_cli = AppGroup("storage", help="S3 object storage maintenance.")
+notes_cli = AppGroup("notes", help="Bulk note management.")
+
+
+@search_cli.command("rebuild")
+def rebuild_search_index():
+    """Drop and repopulate the FTS5 note index."""
+    if ensure_search_index(rebuild=True):
+        click.echo("Search index rebuilt.")
+    else:
+        click.echo("FTS5 is not available on this database; using LIKE search.")
+
+
+def _listing_queries():
+    from app.blueprints.notes import filtered_notes_query
+
+    per_page = current_app.config["NOTES_PER_PAGE"] + 1
+    cases = []
+
+    for label, filters, sort in [
+        ("notes.list", {}, "newest"),
+        ("notes.list ?sort=oldest", {}, "oldest"),
+        ("notes.list ?sort=title", {}, "title"),
+        ("notes.list ?subject", {"subject_id": 1}, "newest"),
+        ("notes.list ?note_type", {"note_type_id": 1}, "newest"),
+        ("notes.list ?user", {"user_id": 1}, "newest"),
+        ("notes.list ?search", {"search": "note"}, "newest"),
+        ("notes.list ?search&sort=relevance", {"search": "note"}, "relevance"),
+    ]:
+        args = {"search": "", "subject_id": None, "note_type_id": None, "user_id": None}
+        args.update(filters)
+        query, key = filtered_notes_query(sort=sort, **args)
+        cases.append((label, keyset_query(query, sort, key=key).limit(per_page)))
+        cases.append(
+            (f"{label} (next page)", keyset_query(query, sort, 1, key=key).limit(per_page))
+        )
+
+    my_notes = Note.query.filter_by(user_id=1).options(
+        joinedload(Note.subject), joinedload(Note.note_type)
+    )
+    cases.append(("notes.my_notes", keyset_query(my_notes).limit(per_page)))
+    cases.append(
+        (
+            "notes.activity",
+            Note.query.options(joinedload(Note.user), joinedload(Note.subject))
+            .order_by(Note.created_at.desc())
+            .limit(20),
+        )
+    )
+    admin_per_page = current_app.config["ADMIN_NOTES_PER_PAGE"] + 1
+    for label, filters in [
+        ("admin.notes", {}),
+        ("admin.notes ?user", {"user_id": 1}),
+    ]:
+        args = {"search": "", "subject_id": None, "note_type_id": None, "user_id": None}
+        args.update(filters)
+        query, _ = filtered_notes_query(sort="newest", **args)
+        cases.append((label, keyset_query(query).limit(admin_per_page)))
+    cases.append(
+        (
+            "main.profile",
+            Note.query.filter_by(user_id=1)
+            .options(joinedload(Note.subject))
+            .order_by(Note.created_at.desc())
+            .limit(5),
+        )
+    )
+    cases.append(
+        (
+            "_finish_login",
+            OAuth.query.filter_by(provider="google", provider_user_id="0").limit(1),
+        )
+    )
+    return cases
+
+
+@queries_cli.command("explain")
+def explain_queries():
+    """Run EXPLAIN QUERY PLAN on every listing query and flag full scans."""
+    if not db.engine.dialect.name.startswith("sqlite"):
+        raise click.ClickException("EXPLAIN QUERY PLAN is SQLite-only.")
+
+    full_scans = 0
+    for label, query in _listing_queries():
+        sql = query.statement.compile(
+            dialect=db.engine.dialect, compile_kwargs={"literal_binds": True}
+        )
+        plan = db.session.execute(text(f"EXPLAIN QUERY PLAN {sql}")).all()
+
+        click.echo(label)
+        for row in plan:
+            detail = row[-1]
+            # "SCAN note" without an index is a full table scan; index scans read
+            # "SCAN note USING INDEX ..." and FTS5 reads "SCAN note_fts VIRTUAL TABLE".
+            is_full_scan = detail.startswith("SCAN ") and not (
+                "USING" in detail or "VIRTUAL TABLE" in detail
+            )
+            full_scans += is_full_scan
+            click.echo(f"  {'!!' if is_full_scan else '  '} {detail}")
+
+    if full_scans:
+        raise click.ClickException(f"{full_scans} full table scan(s) found.")
+    click.echo("No full table scans.")
+
+
+@imports_cli.command("worker")
+@click.option("--once", is_flag=True, help="Exit when the queue is empty.")
+def import_worker(once):
+    """Copy queued Drive links into S3."""
+    run_pending_imports(current_app._get_current_object(), once=once)
+
+
+@thumbnails_cli.command("backfill")
+def backfill_thumbnails():
+    """Render thumbnails for image notes that do not have them yet."""
+    candidates = Note.query.filter(
+        Note.original_link.is_(None),
+        Note.thumbnail_key.is_(None),
+        db.or_(*(Note.link.ilike(f"%.{ext}") for ext in RASTER_EXTENSIONS)),
+    ).with_entities(Note.id)
+    note_ids = [note_id for (note_id,) in candidates]
+
+    done = failed = 0
+    for note_id in note_ids:
+        try:
+            if generate_thumbnails(note_id):
+                done += 1
+        except Exception as e:
+            db.session.rollback()
+            failed += 1
+            click.echo(f"Note {note_id}: {e}", err=True)
+    click.echo(f"Rendered thumbnails for {done} note(s), {failed} failed.")
+
+
+@stats_cli.command("reconcile")
+def reconcile_statistics():
+    """Recount dashboard statistics from the tables and fix drift."""
+    drift = reconcile_stats()
+    click.echo(f"Statistics reconciled, {drift} row(s) corrected.")
+
+
+@storage_cli.command("sweep")
+@click.option(
+    "--min-age-hours",
+    default=24,
+    show_default=True,
+    help="Leave objects younger than this alone.",
+)
+@click.option("--dry-run", is_flag=True, help="List orphaned objects only.")
+def sweep_storage(min_age_hours, dry_run):
+    """Delete S3 objects that no note references any more."""
+    orphaned = sweep_orphaned_objects(min_age_hours * 3600, dry_run=dry_run)
+    for key in orphaned:
+        click.echo(key)
+    verb = "Found" if dry_run else "Deleted"
+    click.echo(f"{verb} {len(orphaned)} orphaned object(s).")
+
+
+def _print_import_progress(progress, errors):
+    for number, error in sorted(errors.items()):
+        click.echo(f"Row {number}: {error}", err=True)
+    elapsed = max(progress.elapsed, 1e-6)
+    click.echo(
+        f"{progress.rows_done}/{progress.rows_total} rows: "
+        f"{progress.inserted} added, {progress.skipped} skipped, "
+        f"{progress.failed} failed | {progress.inserted / elapsed:.1f} notes/s, "
+        f"{progress.bytes_uploaded / elapsed / 1e6:.2f} MB/s uploaded"
+    )
+
+
+@notes_cli.command("import")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option("--user", "user_email", help="Uploader email for rows without one.")
+@click.option("--batch-size", default=500, show_default=True, type=int)
+@click.option(
+    "--workers",
+    type=int,
+    help="Concurrent S3 uploads.  [default: S3_UPLOAD_WORKERS]",
+)
+@click.option("--create-subjects", is_flag=True, help="Add subjects not found.")
+@click.option("--restart", is_flag=True, help="Ignore the saved checkpoint.")
+def import_notes(manifest, user_email, batch_size, workers, create_subjects, restart):
+    """Create notes from a CSV or NDJSON manifest of files and links.
+
+    Columns: title, subject, file or link, and optionally description and
+    user. Interrupted imports resume from the last committed batch.
+    """
+    try:
+        result = import_manifest(
+            manifest,
+            default_user=user_email,
+            batch_size=max(1, batch_size),
+            workers=workers or current_app.config["S3_UPLOAD_WORKERS"],
+            create_subjects=create_subjects,
+            restart=restart,
+            progress=_print_import_progress,
+        )
+    except ManifestError as e:
+        raise click.ClickException(str(e))
+
+    if result.failed:
+        raise click.ClickException(
+            f"{result.failed} row(s) failed; run the same command again to retry."
+        )
+    if result.inserted:
+        click.echo("Run 'flask thumbnails backfill' to render image thumbnails.")
+
+
+@db_cli.command("restore-ndjson")
+@click.argument("dump", type=click.Path(exists=True, dir_okay=False))
+def restore_ndjson_dump(dump):
+    """Load an admin database export (.ndjson.gz) into an empty database.
+
+    Create the schema first with 'flask db upgrade' at the dump's revision.
+    """
+    opener = gzip.open if dump.endswith(".gz") else open
+    try:
+        with opener(dump, "rt", encoding="utf-8") as lines:
+            counts = restore_ndjson(lines, current_app.config["EXPORT_BATCH_SIZE"])
+    except ValueError as e:
+        raise click.ClickException(str(e))
+
+    ensure_search_index(rebuild=True)
+    click.echo(f"Restored {sum(counts.values())} row(s) into {len(counts)} table(s).")
+
+
+def register_commands(app):
+    app.cli.add_command(search_cli)
+    app.cli.add_command(queries_cli)
+    app.cli.add_command(imports_cli)
+    app.cli.add_command(thumbnails_cli)
+    app.cli.add_command(stats_cli)
+    app.cli.add_command(storage_cli)
+    app.cli.add_command(notes_cli)
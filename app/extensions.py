@@ -1,7 +1,161 @@
+import os
+import threading
+
+from flask import has_request_context, request
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
 from flask_login import LoginManager
 from flask_migrate import Migrate
+from sqlalchemy import event
+
+# Bind key of the query-only pool that GET requests read from (config.py).
+SQLITE_READ_BIND = "sqlite_reader"
+SQLITE_DRIVERS = {"sqlite", "sqlite+pysqlite"}
+SQLITE_SYNCHRONOUS_LEVELS = {"OFF", "NORMAL", "FULL", "EXTRA"}
+READ_METHODS = {"GET", "HEAD"}
+# Statements before which the sqlite3 module opens its implicit transaction.
+_WRITE_STATEMENTS = ("INSERT", "UPDATE", "DELETE", "REPLACE")
+
+# One write transaction at a time per process; BEGIN IMMEDIATE and
+# busy_timeout order the processes among themselves.
+_write_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    global _write_lock
+    _write_lock = threading.Lock()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
 
-db = SQLAlchemy()
+class RoutingSession(Session):
+    """Session that reads from the query-only SQLite pool during GET requests.
+
+    The first statement that may write, and everything after it until the
+    transaction ends, goes to the main engine so a request sees its own writes.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._can_use_reader(clause):
+            return self._db.engines[SQLITE_READ_BIND]
+        if has_request_context() and request.method in READ_METHODS:
+            self.info["sqlite_wrote"] = True
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _can_use_reader(self, clause):
+        if (
+            clause is None
+            or self._flushing
+            or self.info.get("sqlite_wrote")
+            or not has_request_context()
+            or request.method not in READ_METHODS
+            or SQLITE_READ_BIND not in self._db.engines
+        ):
+            return False
+        if getattr(clause, "is_select", False):
+            return True
+        # Raw SQL such as the full-text search query.
+        text = getattr(clause, "text", "").lstrip()[:6].upper()
+        return text in ("SELECT", "WITH")
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _forget_write(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("sqlite_wrote", None)
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 migrate = Migrate()
 login_manager = LoginManager()
+
+
+def _pragmas(config, read_only):
+    synchronous = config["SQLITE_SYNCHRONOUS"].upper()
+    if synchronous not in SQLITE_SYNCHRONOUS_LEVELS:
+        raise ValueError(
+            f"SQLITE_SYNCHRONOUS must be one of {sorted(SQLITE_SYNCHRONOUS_LEVELS)}"
+        )
+
+    pragmas = [
+        # First, so switching to WAL waits for other connections like any lock.
+        f"busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        "journal_mode = WAL",
+        f"synchronous = {synchronous}",
+        f"mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+        # Negative values are KiB rather than pages.
+        f"cache_size = -{int(config['SQLITE_CACHE_SIZE_KB'])}",
+    ]
+    if read_only:
+        pragmas.append("query_only = ON")
+    return pragmas
+
+
+def _release_write_lock(info):
+    if info.pop("sqlite_write_lock", False):
+        _write_lock.release()
+
+
+def _listen_sqlite(engine, pragmas, read_only, lock_timeout):
+    def _connect(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(f"PRAGMA {pragma}")
+        cursor.close()
+        if not read_only:
+            # sqlite3 opens its implicit transaction with BEGIN IMMEDIATE, so a
+            # writer waits for the file lock up front (within busy_timeout)
+            # instead of failing to upgrade a read snapshot mid-transaction.
+            dbapi_connection.isolation_level = "IMMEDIATE"
+
+    event.listen(engine, "connect", _connect)
+    if read_only:
+        return
+
+    def _before_execute(conn, cursor, statement, parameters, context, executemany):
+        if conn.info.get("sqlite_write_lock") or cursor.connection.in_transaction:
+            return
+        if statement.lstrip()[:7].upper().startswith(_WRITE_STATEMENTS):
+            # Bounded, so a writer stuck behind its own thread pool falls back
+            # to SQLite's busy handling instead of deadlocking.
+            if _write_lock.acquire(timeout=lock_timeout):
+                conn.info["sqlite_write_lock"] = True
+
+    def _end_transaction(conn):
+        _release_write_lock(conn.info)
+
+    def _reset(dbapi_connection, connection_record, reset_state):
+        _release_write_lock(connection_record.info)
+
+    def _invalidate(dbapi_connection, connection_record, exception):
+        _release_write_lock(connection_record.info)
+
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "commit", _end_transaction)
+    event.listen(engine, "rollback", _end_transaction)
+    event.listen(engine.pool, "reset", _reset)
+    event.listen(engine.pool, "invalidate", _invalidate)
+
+
+def init_sqlite(app):
+    """Apply the SQLite engine profile to every local SQLite engine.
+
+    Every connection gets WAL, busy_timeout, synchronous, mmap_size and
+    cache_size. Writes start with BEGIN IMMEDIATE and are serialized within
+    the process; the read pool is query-only. sqlitecloud and other backends
+    are left alone.
+    """
+    with app.app_context():
+        engines = dict(db.engines)
+
+    lock_timeout = app.config["SQLITE_BUSY_TIMEOUT_MS"] / 1000
+    for key, engine in engines.items():
+        url = engine.url
+        if url.drivername not in SQLITE_DRIVERS:
+            continue
+        if url.database in (None, "", ":memory:"):
+            continue
+        read_only = key == SQLITE_READ_BIND
+        pragmas = _pragmas(app.config, read_only)
+        _listen_sqlite(engine, pragmas, read_only, lock_timeout)
@@ -16,6 +16,7 @@ class OAuth(OAuthConsumerMixin, db.Model):
         db.UniqueConstraint(
             "provider", "provider_user_id", name="uq_oauth_provider_user"
         ),
+        db.Index("ix_oauth_user_provider", "user_id", "provider"),
     )
 
     user_id = db.Column(db.Integer, db.ForeignKey(User.id), nullable=False)
@@ -42,6 +43,16 @@ class NoteType(db.Model):
 
 
 class Note(db.Model):
+    # Each listing filters on at most one foreign key and pages on created_at or
+    # title (see app.utilities.pagination), so every index ends in the sort key.
+    __table_args__ = (
+        db.Index("ix_note_created_at", "created_at"),
+        db.Index("ix_note_title", "title"),
+        db.Index("ix_note_subject_created", "subject_id", "created_at"),
+        db.Index("ix_note_user_created", "user_id", "created_at"),
+        db.Index("ix_note_note_type_created", "note_type_id", "created_at"),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     title = db.Column(db.String(200), nullable=False)
@@ -49,6 +60,12 @@ class Note(db.Model):
 
     link = db.Column(db.String(500), nullable=True)
     original_link = db.Column(db.String(500), nullable=True)
+    # Uploaded files live under their content hash; this keeps the name shown
+    # to users.
+    filename = db.Column(db.String(255), nullable=True)
+    # Resized WebP copies of image uploads, filled in by a background worker.
+    thumbnail_key = db.Column(db.String(500), nullable=True)
+    preview_key = db.Column(db.String(500), nullable=True)
 
     note_type_id = db.Column(db.Integer, db.ForeignKey("note_type.id"), nullable=False)
     subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), nullable=False)
@@ -61,3 +78,67 @@ class Note(db.Model):
     user = db.relationship("User", backref=db.backref("notes", lazy=True))
     subject = db.relationship("Subject", back_populates="notes")
     note_type = db.relationship("NoteType", back_populates="notes")
+
+
+class StoredObject(db.Model):
+    """One S3 object per distinct file content, shared by every note using it."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    sha256 = db.Column(db.String(64), unique=True, nullable=False)
+    key = db.Column(db.String(500), unique=True, nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    content_type = db.Column(db.String(255), nullable=False)
+    # Number of notes whose link is this key; the object is deleted at zero.
+    ref_count = db.Column(db.Integer, nullable=False, default=0)
+
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=db.func.current_timestamp()
+    )
+
+
+class PlatformStat(db.Model):
+    """A counter kept current on every write (see app.utilities.stats).
+
+    ``scope`` is total, subject, note_type, user or day; ``key`` is the table
+    name, the related id or the ISO date.
+    """
+
+    scope = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    value = db.Column(db.Integer, nullable=False, default=0)
+
+
+class ImportJob(db.Model):
+    """Background copy of an external (Google Drive) link into S3."""
+
+    __table_args__ = (db.Index("ix_import_job_status_id", "status", "id"),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    note_id = db.Column(db.Integer, db.ForeignKey("note.id"), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), nullable=False)
+    source_url = db.Column(db.String(500), nullable=False)
+
+    # queued -> running -> done | failed
+    status = db.Column(db.String(20), nullable=False, default="queued")
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    bytes_done = db.Column(db.BigInteger, nullable=False, default=0)
+    bytes_total = db.Column(db.BigInteger, nullable=True)
+    error = db.Column(db.Text, nullable=True)
+    # A running job whose lease has passed is assumed abandoned and re-queued.
+    locked_until = db.Column(db.DateTime, nullable=True)
+
+    created_at = db.Column(
+        db.DateTime, nullable=False, default=db.func.current_timestamp()
+    )
+    updated_at = db.Column(
+        db.DateTime,
+        nullable=False,
+        default=db.func.current_timestamp(),
+        onupdate=db.func.current_timestamp(),
+    )
+
+    note = db.relationship(
+        "Note",
+        backref=db.backref("import_jobs", cascade="all, delete-orphan", lazy=True),
+    )
+    user = db.relationship("User")
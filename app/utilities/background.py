@@ -0,0 +1,37 @@
+import os
+import threading
+
+_threads = {}
+_threads_lock = threading.Lock()
+
+
+def _reset_after_fork():
+    # Threads do not survive fork; forget the parent's and replace a lock that
+    # may have been held at fork time.
+    global _threads_lock
+    _threads_lock = threading.Lock()
+    _threads.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def ensure_background_thread(name, target, *args):
+    """Start ``target(*args)`` as a named daemon thread unless already running.
+
+    Safe to call on every request: the fast path is a dict lookup and a
+    liveness check, and each gunicorn worker gets its own thread after fork.
+    """
+    thread = _threads.get(name)
+    if thread is not None and thread.is_alive():
+        return thread
+
+    with _threads_lock:
+        thread = _threads.get(name)
+        if thread is not None and thread.is_alive():
+            return thread
+
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        _threads[name] = thread
+        return thread
@@ -0,0 +1,144 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+# Path -> SharedCache, so every caller in a process shares one connection set.
+_SHARED_CACHES = {}
+# Name -> TTLCache, sized from config when first used.
+_LOCAL_CACHES = {}
+
+
+class TTLCache:
+    """Thread-safe, size-bounded LRU whose entries carry their own expiry.
+
+    Expired entries are dropped when they are read or when they reach the LRU
+    end, so every operation is O(1); there is no sweep over the whole cache.
+    """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at <= now:
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, expires_at):
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            entry = self._data.pop(key, None)
+        return entry[0] if entry else None
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SharedCache:
+    """Key/value cache in a local SQLite file, shared by every worker process.
+
+    Each thread opens its own connection (re-opened after fork). Expired rows
+    are purged every ``purge_every`` writes using the expires_at index.
+    """
+
+    def __init__(self, path, purge_every=500):
+        self.path = path
+        self.purge_every = purge_every
+        self.hits = 0
+        self.misses = 0
+        self._local = threading.local()
+        self._writes = 0
+
+    def _conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_expires_at ON cache (expires_at)"
+            )
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def get(self, key, now=None):
+        now = time.time() if now is None else now
+        row = (
+            self._conn()
+            .execute(
+                "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?",
+                (key, now),
+            )
+            .fetchone()
+        )
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row
+
+    def set(self, key, value, expires_at):
+        conn = self._conn()
+        conn.execute(
+            "INSERT OR REPLACE INTO cache (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, expires_at),
+        )
+        self._writes += 1
+        if self._writes % self.purge_every == 0:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, key):
+        self._conn().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+
+def get_shared_cache(path):
+    """Return the process-wide ``SharedCache`` for ``path``, or None if unset."""
+    if not path:
+        return None
+    cache = _SHARED_CACHES.get(path)
+    if cache is None:
+        cache = _SHARED_CACHES.setdefault(path, SharedCache(path))
+    return cache
+
+
+def get_local_cache(name, maxsize):
+    """Return the process-wide ``TTLCache`` called ``name``.
+
+    It is created on first use with ``maxsize``; later calls reuse it as is.
+    """
+    cache = _LOCAL_CACHES.get(name)
+    if cache is None:
+        cache = _LOCAL_CACHES.setdefault(name, TTLCache(maxsize))
+    return cache
@@ -0,0 +1,178 @@
+import base64
+import json
+import zlib
+from collections import Counter
+from datetime import date, datetime
+from decimal import Decimal
+
+from sqlalchemy import (
+    Date,
+    DateTime,
+    LargeBinary,
+    MetaData,
+    Numeric,
+    Table,
+    inspect,
+    literal,
+    select,
+    text,
+    tuple_,
+)
+
+from app.extensions import SQLITE_DRIVERS, db
+
+# zlib window bits for a gzip container, so exports open with gunzip.
+_GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def gzip_stream(chunks, level=6):
+    """Compress an iterable of byte chunks into a gzip stream as it is read."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, _GZIP_WBITS)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def _json_default(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return base64.b64encode(bytes(value)).decode("ascii")
+    raise TypeError(f"Cannot export {type(value).__name__} values")
+
+
+def _export_tables(conn):
+    tables = list(db.metadata.sorted_tables)
+    # Record the schema revision so a dump can be restored into the right schema.
+    if inspect(conn).has_table("alembic_version"):
+        tables.append(Table("alembic_version", MetaData(), autoload_with=conn))
+    return tables
+
+
+def _table_batches(conn, table, batch_size):
+    key = list(table.primary_key.columns)
+    if not key:
+        # Nothing unique to page on; stream one query where the driver can.
+        result = conn.execution_options(stream_results=True).execute(select(table))
+        yield from result.mappings().partitions(batch_size)
+        return
+
+    # Keyset paging on the primary key: constant memory on every backend and
+    # no server-side cursor support needed from the driver.
+    query = select(table).order_by(*key).limit(batch_size)
+    rows = conn.execute(query).mappings().all()
+    while rows:
+        yield rows
+        if len(rows) < batch_size:
+            return
+        last = [rows[-1][column.name] for column in key]
+        if len(key) == 1:
+            after = key[0] > last[0]
+        else:
+            after = tuple_(*key) > tuple_(*last)
+        rows = conn.execute(query.where(after)).mappings().all()
+
+
+def ndjson_dump_chunks(batch_size):
+    """Yield every application table as NDJSON, one ``{"table", "row"}`` per line.
+
+    All tables are read inside one transaction so the dump is a consistent
+    snapshot; rows are fetched ``batch_size`` at a time. Under WAL a local
+    SQLite file keeps taking writes while the snapshot is read.
+    """
+    with db.engine.connect() as conn, conn.begin():
+        if conn.engine.url.drivername in SQLITE_DRIVERS:
+            # The sqlite3 module opens no transaction for SELECTs on its own.
+            conn.exec_driver_sql("BEGIN")
+        for table in _export_tables(conn):
+            for rows in _table_batches(conn, table, batch_size):
+                lines = [
+                    json.dumps(
+                        {"table": table.name, "row": dict(row)},
+                        default=_json_default,
+                        separators=(",", ":"),
+                    )
+                    for row in rows
+                ]
+                yield ("\n".join(lines) + "\n").encode("utf-8")
+
+
+def _decoders(table):
+    # Inverse of _json_default for the column types that need it.
+    decoders = {}
+    for column in table.columns:
+        kind = column.type
+        if isinstance(kind, DateTime):
+            decoders[column.name] = datetime.fromisoformat
+        elif isinstance(kind, Date):
+            decoders[column.name] = date.fromisoformat
+        elif isinstance(kind, LargeBinary):
+            decoders[column.name] = base64.b64decode
+        elif isinstance(kind, Numeric) and kind.asdecimal:
+            decoders[column.name] = Decimal
+    return decoders
+
+
+def _decode(row, decoders):
+    return {
+        name: decoders[name](value) if value is not None and name in decoders else value
+        for name, value in row.items()
+    }
+
+
+def _current_revision(conn):
+    if not inspect(conn).has_table("alembic_version"):
+        return None
+    return conn.execute(text("SELECT version_num FROM alembic_version")).scalar()
+
+
+def restore_ndjson(lines, batch_size):
+    """Load a dump from ``ndjson_dump_chunks`` into an empty, migrated database.
+
+    ``lines`` is any iterable of NDJSON lines, such as the opened dump. The
+    database must be at the dump's schema revision (``flask db upgrade``) and
+    hold no rows. Rows are inserted ``batch_size`` at a time in one
+    transaction. Returns ``{table name: rows restored}``.
+    """
+    tables = {table.name: table for table in db.metadata.sorted_tables}
+    decoders = {name: _decoders(table) for name, table in tables.items()}
+    counts = Counter()
+
+    with db.engine.begin() as conn:
+        for table in tables.values():
+            if conn.execute(select(literal(1)).select_from(table).limit(1)).first():
+                raise ValueError(
+                    f"Table {table.name} is not empty; restore into a fresh database."
+                )
+        revision = _current_revision(conn)
+
+        pending_table, pending = None, []
+        for line in lines:
+            if not line.strip():
+                continue
+            record = json.loads(line)
+            name, row = record["table"], record["row"]
+            if name == "alembic_version":
+                if row["version_num"] != revision:
+                    raise ValueError(
+                        f"The dump is at revision {row['version_num']} and the "
+                        f"database at {revision}; run 'flask db upgrade "
+                        f"{row['version_num']}' first."
+                    )
+                continue
+            if name not in tables:
+                raise ValueError(f"Unknown table {name} in the dump.")
+
+            if pending and (name != pending_table or len(pending) >= batch_size):
+                conn.execute(tables[pending_table].insert(), pending)
+                pending = []
+            pending_table = name
+            pending.append(_decode(row, decoders[name]))
+            counts[name] += 1
+        if pending:
+            conn.execute(tables[pending_table].insert(), pending)
+    return dict(counts)
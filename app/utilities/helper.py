@@ -1,13 +1,20 @@
-import io
 import re
 
 import requests
 from flask import current_app
+from google.auth.transport.requests import AuthorizedSession
 from google.oauth2.credentials import Credentials
-from googleapiclient.discovery import build
-from googleapiclient.http import MediaIoBaseDownload
 from werkzeug.utils import secure_filename
 
+from app.utilities.storage import store_file
+
+DRIVE_API_FILES_URL = "https://www.googleapis.com/drive/v3/files"
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class DriveFileTooLarge(ValueError):
+    pass
+
 
 def extract_drive_id(url: str):
     patterns = [
@@ -22,41 +29,98 @@ def extract_drive_id(url: str):
     return None
 
 
-def process_drive_link(drive_url, user):
+class _ResponseStream:
+    """File-like ``read(n)`` over a streamed HTTP response.
+
+    Buffers at most ``n`` bytes plus one network chunk, enforces ``max_bytes``
+    and reports ``progress(bytes_read, total)`` as chunks arrive.
+    """
+
+    def __init__(self, response, max_bytes, total=None, progress=None):
+        self._chunks = response.iter_content(DOWNLOAD_CHUNK_SIZE)
+        self._buffer = bytearray()
+        self.max_bytes = max_bytes
+        self.total = total
+        self.progress = progress
+        self.bytes_read = 0
+
+    def read(self, size):
+        while len(self._buffer) < size:
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                break
+            self.bytes_read += len(chunk)
+            if self.bytes_read > self.max_bytes:
+                raise DriveFileTooLarge(
+                    f"Drive file exceeds the {self.max_bytes} byte import limit"
+                )
+            self._buffer += chunk
+            if self.progress:
+                self.progress(self.bytes_read, self.total)
+
+        data = bytes(self._buffer[:size])
+        del self._buffer[:size]
+        return data
+
+
+def _stream_to_s3(response, filename, mime_type, size=None, progress=None):
+    max_bytes = current_app.config["DRIVE_IMPORT_MAX_BYTES"]
+    if size is not None and int(size) > max_bytes:
+        raise DriveFileTooLarge(
+            f"Drive file is {size} bytes, the import limit is {max_bytes}"
+        )
+
+    stream = _ResponseStream(
+        response,
+        max_bytes,
+        total=int(size) if size is not None else None,
+        progress=progress,
+    )
+    stored = store_file(stream, filename, content_type=mime_type)
+    return {
+        "key": stored.key,
+        "filename": filename,
+        "mime_type": mime_type,
+        "size": stored.size,
+        "stored": stored,
+    }
+
+
+def process_drive_link(drive_url, user, progress=None):
+    """Copy a Google Drive file into S3 without holding it in memory.
+
+    Tries the public download URL first and falls back to the user's Google
+    OAuth token (drive.readonly). Both paths stream through ``_stream_to_s3``.
+    Returns ``downloaded=False`` with the original link if neither works.
+    """
     file_id = extract_drive_id(drive_url)
     if not file_id:
         raise ValueError("Invalid Or Unsupported Google Drive URL Format")
 
     public_download_url = f"https://drive.google.com/uc?export=download&id={file_id}"
     try:
-        response = requests.get(public_download_url, stream=True, timeout=10)
-        if response.status_code == 200:
-            content = response.content
-            filename = (
-                response.headers.get("Content-Disposition", "")
-                .split("filename=")[-1]
-                .strip('"')
-                or f"drive_file_{file_id}"
-            )
-            filename = secure_filename(filename)
+        with requests.get(public_download_url, stream=True, timeout=10) as response:
             mime_type = response.headers.get("Content-Type", "application/octet-stream")
-            size = len(content)
-
-            fh = io.BytesIO(content)
-            fh.seek(0)
-
-            return {
-                "file": fh,
-                "filename": filename,
-                "mime_type": mime_type,
-                "size": size,
-                "file_id": file_id,
-                "downloaded": True,
-            }
+            # Files Drive cannot virus-scan come back as an HTML confirm page.
+            if response.status_code == 200 and not mime_type.startswith("text/html"):
+                filename = (
+                    response.headers.get("Content-Disposition", "")
+                    .split("filename=")[-1]
+                    .strip('"')
+                    or f"drive_file_{file_id}"
+                )
+                result = _stream_to_s3(
+                    response,
+                    secure_filename(filename),
+                    mime_type,
+                    size=response.headers.get("Content-Length"),
+                    progress=progress,
+                )
+                return {**result, "file_id": file_id, "downloaded": True}
     except requests.RequestException:
         pass
 
-    oauth = user.oauth_accounts.filter_by(provider="google").first()
+    oauth = next((o for o in user.oauth_accounts if o.provider == "google"), None)
     if not oauth:
         return {
             "original_link": drive_url,
@@ -71,35 +135,34 @@ def process_drive_link(drive_url, user):
         client_secret=current_app.config["GOOGLE_CLIENT_SECRET"],
         scopes=["https://www.googleapis.com/auth/drive.readonly"],
     )
-
-    service = build("drive", "v3", credentials=creds)
+    session = AuthorizedSession(creds)
 
     try:
-        metadata = (
-            service.files().get(fileId=file_id, fields="name, mimeType, size").execute()
+        metadata = session.get(
+            f"{DRIVE_API_FILES_URL}/{file_id}",
+            params={"fields": "name, mimeType, size"},
+            timeout=10,
         )
-        filename = secure_filename(metadata["name"])
-        mime_type = metadata["mimeType"]
-
-        request = service.files().get_media(fileId=file_id)
-        fh = io.BytesIO()
-
-        downloader = MediaIoBaseDownload(fh, request)
-
-        done = False
-        while not done:
-            status, done = downloader.next_chunk()
-
-        fh.seek(0)
-
-        return {
-            "file": fh,
-            "filename": filename,
-            "mime_type": mime_type,
-            "size": metadata.get("size"),
-            "file_id": file_id,
-            "downloaded": True,
-        }
+        metadata.raise_for_status()
+        metadata = metadata.json()
+
+        with session.get(
+            f"{DRIVE_API_FILES_URL}/{file_id}",
+            params={"alt": "media"},
+            stream=True,
+            timeout=30,
+        ) as response:
+            response.raise_for_status()
+            result = _stream_to_s3(
+                response,
+                secure_filename(metadata["name"]),
+                metadata["mimeType"],
+                size=metadata.get("size"),
+                progress=progress,
+            )
+        return {**result, "file_id": file_id, "downloaded": True}
+    except DriveFileTooLarge:
+        raise
     except Exception:
         return {
             "original_link": drive_url,
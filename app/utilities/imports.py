@@ -0,0 +1,233 @@
+import threading
+import time
+from datetime import datetime, timedelta
+from urllib.parse import urlparse
+
+from flask import current_app
+from sqlalchemy import or_
+
+from app.extensions import db
+from app.models import ImportJob, Note
+from app.utilities.background import ensure_background_thread
+from app.utilities.helper import DriveFileTooLarge, extract_drive_id, process_drive_link
+from app.utilities.storage import (
+    ContentReleased,
+    discard_unreferenced,
+    retain_object,
+)
+from app.utilities.thumbnails import queue_thumbnails
+
+MAX_ATTEMPTS = 3
+LEASE_SECONDS = 15 * 60
+PROGRESS_INTERVAL_SECONDS = 1.0
+
+_wakeup = threading.Event()
+
+
+def is_drive_link(url):
+    host = urlparse(url).netloc.lower()
+    return host == "drive.google.com" and extract_drive_id(url) is not None
+
+
+def enqueue_drive_import(note):
+    """Queue ``note`` (an external Drive link) to be copied into S3.
+
+    The job is added to the current session so it commits with the note.
+    """
+    job = ImportJob(
+        note=note,
+        user_id=note.user_id,
+        source_url=note.link,
+        status="queued",
+        attempts=0,
+        bytes_done=0,
+    )
+    db.session.add(job)
+    return job
+
+
+def wake_import_worker():
+    if current_app.config["IMPORT_WORKER_IN_PROCESS"]:
+        ensure_import_worker(current_app._get_current_object())
+    _wakeup.set()
+
+
+def job_status(job):
+    percent = None
+    if job.bytes_total:
+        percent = min(100, round(job.bytes_done * 100 / job.bytes_total))
+    elif job.status == "done":
+        percent = 100
+    return {
+        "id": job.id,
+        "note_id": job.note_id,
+        "status": job.status,
+        "bytes_done": job.bytes_done,
+        "bytes_total": job.bytes_total,
+        "percent": percent,
+        "attempts": job.attempts,
+        "error": job.error,
+    }
+
+
+def _claim_next_job():
+    now = datetime.utcnow()
+    candidate = (
+        db.session.query(ImportJob.id)
+        .filter(
+            or_(
+                ImportJob.status == "queued",
+                (ImportJob.status == "running") & (ImportJob.locked_until < now),
+            )
+        )
+        .order_by(ImportJob.id)
+        .limit(1)
+        .scalar()
+    )
+    if candidate is None:
+        return None
+
+    # Conditional update: only one worker (thread or process) wins the row.
+    claimed = (
+        db.session.query(ImportJob)
+        .filter(
+            ImportJob.id == candidate,
+            or_(
+                ImportJob.status == "queued",
+                (ImportJob.status == "running") & (ImportJob.locked_until < now),
+            ),
+        )
+        .update(
+            {
+                ImportJob.status: "running",
+                ImportJob.attempts: ImportJob.attempts + 1,
+                ImportJob.locked_until: now + timedelta(seconds=LEASE_SECONDS),
+                ImportJob.error: None,
+            },
+            synchronize_session=False,
+        )
+    )
+    db.session.commit()
+    return db.session.get(ImportJob, candidate) if claimed else None
+
+
+def _progress_reporter(job_id):
+    last = {"at": 0.0}
+
+    def report(bytes_done, bytes_total):
+        now = time.monotonic()
+        if now - last["at"] < PROGRESS_INTERVAL_SECONDS:
+            return
+        last["at"] = now
+        # Each report also renews the lease, so a long download is not
+        # claimed again by another worker.
+        lease = datetime.utcnow() + timedelta(seconds=LEASE_SECONDS)
+        db.session.query(ImportJob).filter_by(id=job_id, status="running").update(
+            {
+                ImportJob.bytes_done: bytes_done,
+                ImportJob.bytes_total: bytes_total,
+                ImportJob.locked_until: lease,
+            },
+            synchronize_session=False,
+        )
+        db.session.commit()
+
+    return report
+
+
+def _finish(job, status, error=None):
+    job.status = status
+    job.error = error
+    job.locked_until = None
+    db.session.commit()
+
+
+def _reload(job_id):
+    # The admin may delete the note, and with it the job, during a download.
+    db.session.rollback()
+    return db.session.get(ImportJob, job_id)
+
+
+def _retry_or_fail(job_id, error):
+    job = _reload(job_id)
+    if job is not None:
+        _finish(job, "queued" if job.attempts < MAX_ATTEMPTS else "failed", error)
+
+
+def run_import_job(job):
+    job_id = job.id
+    try:
+        result = process_drive_link(
+            job.source_url, job.user, progress=_progress_reporter(job_id)
+        )
+    except DriveFileTooLarge as e:
+        job = _reload(job_id)
+        if job is not None:
+            _finish(job, "failed", str(e))
+        return
+    except Exception as e:
+        current_app.logger.error(f"Import job {job_id} failed: {e}")
+        _retry_or_fail(job_id, str(e))
+        return
+
+    if not result.get("downloaded"):
+        job = _reload(job_id)
+        if job is not None:
+            _finish(job, "failed", "Drive file is not publicly downloadable")
+        return
+
+    job = _reload(job_id)
+    note = db.session.get(Note, job.note_id) if job is not None else None
+    if note is None or note.link != job.source_url:
+        # The note was deleted or edited to another link while we were
+        # downloading.
+        discard_unreferenced([result["stored"]])
+        if job is not None:
+            _finish(job, "failed", "Note link changed during import")
+        return
+
+    try:
+        note.link = retain_object(result["stored"])
+    except ContentReleased as e:
+        # The matching object was released while we downloaded; try again.
+        _retry_or_fail(job_id, str(e))
+        return
+    note.original_link = None
+    note.filename = result["filename"]
+    job.bytes_done = result["size"]
+    job.bytes_total = result["size"]
+    _finish(job, "done")
+    queue_thumbnails([note])
+
+
+def run_pending_imports(app, once=False):
+    """Process queued jobs until the queue is empty (``once``) or forever."""
+    poll_interval = app.config["IMPORT_WORKER_POLL_INTERVAL"]
+    while True:
+        _wakeup.clear()
+        try:
+            with app.app_context():
+                job = _claim_next_job()
+                if job is not None:
+                    run_import_job(job)
+                    continue
+        except Exception as e:
+            app.logger.error(f"Import worker error: {e}")
+
+        if once:
+            return
+        _wakeup.wait(poll_interval)
+
+
+def ensure_import_worker(app):
+    ensure_background_thread("drive-import-worker", run_pending_imports, app)
+
+
+def init_imports(app):
+    if not app.config["IMPORT_WORKER_IN_PROCESS"]:
+        return
+
+    @app.before_request
+    def _start_import_worker():
+        # Picks up jobs queued before a restart or by another worker.
+        ensure_import_worker(app)
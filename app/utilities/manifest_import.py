@@ -0,0 +1,368 @@
+import csv
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
+
+from flask import current_app
+from sqlalchemy import insert
+from werkzeug.utils import secure_filename
+
+from app.extensions import db
+from app.models import ImportJob, Note, Subject, User
+from app.utilities import reference_data
+from app.utilities.imports import is_drive_link
+from app.utilities.search import reindex_notes
+from app.utilities.stats import count_inserted_notes
+from app.utilities.storage import discard_unreferenced, retain_objects, store_file
+
+MANIFEST_EXTENSIONS = {".csv", ".ndjson", ".jsonl"}
+# Rows committed so far are recorded next to the manifest, e.g. notes.csv.progress.
+CHECKPOINT_SUFFIX = ".progress"
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class ManifestRow(NamedTuple):
+    number: int
+    title: str
+    description: Optional[str]
+    subject: str
+    file: Optional[str]
+    link: Optional[str]
+    user: Optional[str]
+
+    @property
+    def note_type(self):
+        # Same two types the upload form offers.
+        return "file" if self.file else "link"
+
+
+class ImportProgress(NamedTuple):
+    rows_done: int
+    rows_total: int
+    inserted: int
+    skipped: int
+    failed: int
+    bytes_uploaded: int
+    elapsed: float
+
+
+def _parse_row(number, record, base_dir):
+    record = {
+        str(k).strip().lower(): str(v).strip()
+        for k, v in record.items()
+        if k is not None and v is not None
+    }
+    title = record.get("title")
+    subject = record.get("subject")
+    file = record.get("file") or None
+    link = record.get("link") or None
+
+    if not title or not subject:
+        raise ManifestError(f"Row {number}: title and subject are required")
+    if bool(file) == bool(link):
+        raise ManifestError(f"Row {number}: give exactly one of file or link")
+
+    return ManifestRow(
+        number=number,
+        title=title,
+        description=record.get("description") or None,
+        subject=subject,
+        file=os.path.join(base_dir, file) if file else None,
+        link=link,
+        user=record.get("user") or None,
+    )
+
+
+def read_manifest(path):
+    """Yield ``ManifestRow`` from a CSV (with a header row) or NDJSON manifest.
+
+    Columns: title, subject, file or link, and optionally description and
+    user (uploader email). File paths are relative to the manifest.
+    """
+    ext = os.path.splitext(path)[1].lower()
+    if ext not in MANIFEST_EXTENSIONS:
+        raise ManifestError(f"Manifest must be one of {sorted(MANIFEST_EXTENSIONS)}")
+
+    base_dir = os.path.dirname(os.path.abspath(path))
+    with open(path, newline="", encoding="utf-8") as manifest:
+        if ext == ".csv":
+            records = csv.DictReader(manifest)
+        else:
+            records = (json.loads(line) for line in manifest if line.strip())
+        for number, record in enumerate(records, 1):
+            yield _parse_row(number, record, base_dir)
+
+
+def _read_checkpoint(path):
+    try:
+        with open(path + CHECKPOINT_SUFFIX, encoding="utf-8") as f:
+            return int(json.load(f)["rows_done"])
+    except FileNotFoundError:
+        return 0
+
+
+def _write_checkpoint(path, rows_done):
+    tmp_path = f"{path}{CHECKPOINT_SUFFIX}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump({"rows_done": rows_done}, f)
+    os.replace(tmp_path, path + CHECKPOINT_SUFFIX)
+
+
+class _Resolved(NamedTuple):
+    subjects: dict
+    note_types: dict
+    users: dict
+
+
+def _resolve(path, default_user, create_subjects):
+    """Validate the manifest and look up every name it uses in one pass."""
+    total = 0
+    subject_names, note_type_names, emails = set(), set(), set()
+    for row in read_manifest(path):
+        total += 1
+        subject_names.add(row.subject)
+        note_type_names.add(row.note_type)
+        emails.add(row.user or default_user)
+
+    if None in emails:
+        raise ManifestError("Rows without a user need --user")
+    users = {
+        user.email: user.id for user in User.query.filter(User.email.in_(emails))
+    }
+    unknown = sorted(emails - users.keys())
+    if unknown:
+        raise ManifestError(f"Unknown user(s): {', '.join(unknown)}")
+
+    subjects = {s.name: s.id for s in reference_data.subjects()}
+    missing = sorted(subject_names - subjects.keys())
+    if missing and not create_subjects:
+        raise ManifestError(
+            f"Unknown subject(s): {', '.join(missing)} (use --create-subjects)"
+        )
+    created = False
+    for name in missing:
+        subject = Subject(name=name)
+        db.session.add(subject)
+        db.session.flush()
+        subjects[name] = subject.id
+        created = True
+
+    note_types = {}
+    for name in note_type_names:
+        note_type, created_type = reference_data.get_or_create_note_type(name)
+        note_types[name] = note_type.id
+        created = created or created_type
+
+    db.session.commit()
+    if created:
+        reference_data.invalidate_reference_data()
+    return total, _Resolved(subjects, note_types, users)
+
+
+def _filename(row):
+    return secure_filename(os.path.basename(row.file))
+
+
+def _upload_batch(pool, app, batch):
+    """Store the batch's files; ``(stored, errors)`` keyed by row number.
+
+    Files are hashed first so content that appears on several rows is
+    uploaded once, and those rows share one ``StoredFile``.
+    """
+
+    def _digest(row):
+        with open(row.file, "rb") as file:
+            return hashlib.file_digest(file, "sha256").hexdigest()
+
+    def _store(row):
+        with app.app_context(), open(row.file, "rb") as file:
+            return store_file(file, _filename(row))
+
+    digests, errors = {}, {}
+    futures = {row.number: pool.submit(_digest, row) for row in batch if row.file}
+    for number, future in futures.items():
+        try:
+            digests[number] = future.result()
+        except Exception as e:
+            errors[number] = e
+
+    first = {}
+    for row in batch:
+        if row.number in digests:
+            first.setdefault(digests[row.number], row)
+    futures = {digest: pool.submit(_store, row) for digest, row in first.items()}
+    by_digest = {}
+    for digest, future in futures.items():
+        try:
+            by_digest[digest] = future.result()
+        except Exception as e:
+            by_digest[digest] = e
+
+    stored = {}
+    for number, digest in digests.items():
+        result = by_digest[digest]
+        if isinstance(result, Exception):
+            errors[number] = result
+        else:
+            stored[number] = result
+    return stored, errors
+
+
+def _existing(rows):
+    """``(user_id, title, link) -> note id`` for rows already in the database."""
+    titles = {row["title"] for row in rows}
+    found = db.session.query(Note.id, Note.user_id, Note.title, Note.link).filter(
+        Note.title.in_(titles)
+    )
+    return {(user_id, title, link): id for id, user_id, title, link in found}
+
+
+def _insert_batch(batch, stored, resolved, default_user):
+    """Insert one batch in one transaction; returns ``(inserted, skipped)``."""
+    rows, sources = [], []
+    for row in batch:
+        if row.file and row.number not in stored:
+            continue
+        upload = stored.get(row.number)
+        rows.append(
+            {
+                "title": row.title,
+                "description": row.description,
+                "link": upload.key if upload else row.link,
+                "original_link": None if upload else row.link,
+                "filename": _filename(row) if upload else None,
+                "note_type_id": resolved.note_types[row.note_type],
+                "subject_id": resolved.subjects[row.subject],
+                "user_id": resolved.users[row.user or default_user],
+            }
+        )
+        sources.append(upload)
+
+    # A crash between commit and checkpoint replays this batch on resume.
+    existing = _existing(rows)
+    fresh = [
+        (values, upload)
+        for values, upload in zip(rows, sources)
+        if (values["user_id"], values["title"], values["link"]) not in existing
+    ]
+    if not fresh:
+        return 0, len(rows)
+
+    keys = retain_objects([upload for _, upload in fresh if upload])
+    for values, upload in fresh:
+        if upload:
+            values["link"] = keys[upload.sha256]
+    values = [values for values, _ in fresh]
+    note_ids = (
+        db.session.execute(
+            insert(Note).returning(Note.id, sort_by_parameter_order=True), values
+        )
+        .scalars()
+        .all()
+    )
+    count_inserted_notes(values)
+    reindex_notes("id", note_ids)
+
+    jobs = [
+        {
+            "note_id": note_id,
+            "user_id": v["user_id"],
+            "source_url": v["link"],
+            "status": "queued",
+            "attempts": 0,
+            "bytes_done": 0,
+        }
+        for note_id, v in zip(note_ids, values)
+        if v["original_link"] and is_drive_link(v["link"])
+    ]
+    if jobs:
+        db.session.execute(insert(ImportJob), jobs)
+
+    db.session.commit()
+    return len(values), len(rows) - len(values)
+
+
+def import_manifest(
+    path,
+    default_user=None,
+    batch_size=500,
+    workers=4,
+    create_subjects=False,
+    restart=False,
+    progress=None,
+):
+    """Create notes for every manifest row, resuming after the last checkpoint.
+
+    Files are uploaded through a pool of ``workers`` threads, one batch at a
+    time, and each batch of notes is inserted with one executemany INSERT.
+    A row that fails is reported through ``progress`` and leaves the
+    checkpoint where it was, so re-running the import retries it; rows
+    already imported are recognised and skipped. Returns the final
+    ``ImportProgress``.
+    """
+    total, resolved = _resolve(path, default_user, create_subjects)
+    rows_done = 0 if restart else _read_checkpoint(path)
+    resumed_at = rows_done
+    inserted = skipped = failed = bytes_uploaded = 0
+    errors = []
+    started = time.monotonic()
+
+    app = current_app._get_current_object()
+    rows = (row for row in read_manifest(path) if row.number > resumed_at)
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        while True:
+            batch = [row for _, row in zip(range(batch_size), rows)]
+            if not batch:
+                break
+
+            stored, batch_errors = _upload_batch(pool, app, batch)
+            try:
+                batch_inserted, batch_skipped = _insert_batch(
+                    batch, stored, resolved, default_user
+                )
+            except Exception:
+                db.session.rollback()
+                discard_unreferenced(stored.values())
+                raise
+
+            inserted += batch_inserted
+            skipped += batch_skipped
+            failed += len(batch_errors)
+            uploads = {s.sha256: s.size for s in stored.values() if s.uploaded}
+            bytes_uploaded += sum(uploads.values())
+            errors.extend(sorted(batch_errors.items()))
+            rows_done = batch[-1].number
+            if not errors:
+                _write_checkpoint(path, rows_done)
+
+            if progress:
+                progress(
+                    ImportProgress(
+                        rows_done,
+                        total,
+                        inserted,
+                        skipped,
+                        failed,
+                        bytes_uploaded,
+                        time.monotonic() - started,
+                    ),
+                    batch_errors,
+                )
+
+    if not errors and os.path.exists(path + CHECKPOINT_SUFFIX):
+        os.remove(path + CHECKPOINT_SUFFIX)
+    return ImportProgress(
+        rows_done,
+        total,
+        inserted,
+        skipped,
+        failed,
+        bytes_uploaded,
+        time.monotonic() - started,
+    )
@@ -0,0 +1,252 @@
+import atexit
+import os
+import sqlite3
+import threading
+import time
+from collections import defaultdict
+
+from flask import g, request
+
+from app.utilities.background import ensure_background_thread
+
+# Family name -> (type, help), in exposition order.
+METRICS = {
+    "porahobe_http_requests_total": (
+        "counter",
+        "HTTP responses by blueprint, endpoint, method and status code.",
+    ),
+    "porahobe_http_request_duration_seconds": (
+        "histogram",
+        "Time to build a response, by blueprint, endpoint and method.",
+    ),
+    "porahobe_sql_queries_total": (
+        "counter",
+        "SQL statements run while serving requests, by blueprint and endpoint.",
+    ),
+    "porahobe_presigned_url_cache_lookups_total": (
+        "counter",
+        "Presigned URL cache lookups by result (local_hit, shared_hit, miss).",
+    ),
+    "porahobe_presigned_url_cache_hit_ratio": (
+        "gauge",
+        "Share of presigned URL cache lookups served from a cache.",
+    ),
+    "porahobe_s3_upload_bytes_total": ("counter", "Bytes uploaded to S3."),
+    "porahobe_s3_upload_duration_seconds": ("histogram", "Time per S3 upload."),
+    "porahobe_webhook_sends_total": (
+        "counter",
+        "Discord webhook POSTs by outcome (sent, rate_limited, retry, dropped).",
+    ),
+}
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+UPLOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+_HISTOGRAM_SUFFIXES = ("_bucket", "_sum", "_count")
+
+# (sample name, rendered labels) -> increment not yet written to the shared file.
+_pending = defaultdict(float)
+_pending_lock = threading.Lock()
+_local = threading.local()
+
+
+def _reset_after_fork():
+    # Anything the parent recorded is the parent's to flush.
+    global _pending_lock
+    _pending_lock = threading.Lock()
+    _pending.clear()
+
+
+os.register_at_fork(after_in_child=_reset_after_fork)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(labels):
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def inc(name, value=1, **labels):
+    """Add ``value`` to a counter; safe from any thread, with or without a request."""
+    key = (name, _labels(labels))
+    with _pending_lock:
+        _pending[key] += value
+
+
+def observe(name, value, buckets=LATENCY_BUCKETS, **labels):
+    """Record one histogram observation of ``value``."""
+    rendered = _labels(labels)
+    prefix = f"{rendered}," if rendered else ""
+    with _pending_lock:
+        # Buckets are cumulative, so every bound at or above the value counts it.
+        for bound in buckets:
+            if value <= bound:
+                _pending[(f"{name}_bucket", f'{prefix}le="{bound}"')] += 1
+        _pending[(f"{name}_bucket", f'{prefix}le="+Inf"')] += 1
+        _pending[(f"{name}_sum", rendered)] += value
+        _pending[(f"{name}_count", rendered)] += 1
+
+
+def _conn(path):
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.pid != os.getpid() or _local.path != path:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=OFF")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS metric (name TEXT NOT NULL, "
+            "labels TEXT NOT NULL, value REAL NOT NULL, PRIMARY KEY (name, labels))"
+        )
+        _local.conn = conn
+        _local.pid = os.getpid()
+        _local.path = path
+    return conn
+
+
+def flush(path):
+    """Add this process's pending increments to the shared metrics file."""
+    with _pending_lock:
+        if not _pending:
+            return
+        batch = list(_pending.items())
+        _pending.clear()
+
+    conn = _conn(path)
+    try:
+        conn.execute("BEGIN IMMEDIATE")
+        conn.executemany(
+            "INSERT INTO metric (name, labels, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (name, labels) DO UPDATE SET value = value + excluded.value",
+            [(name, labels, value) for (name, labels), value in batch],
+        )
+        conn.execute("COMMIT")
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        # Keep the increments for the next flush rather than lose them.
+        with _pending_lock:
+            for key, value in batch:
+                _pending[key] += value
+        raise
+
+
+def _run_flusher(path, interval, logger):
+    while True:
+        time.sleep(interval)
+        try:
+            flush(path)
+        except sqlite3.Error as e:
+            logger.warning(f"Metrics flush failed: {e}")
+
+
+def _family(name):
+    if name in METRICS:
+        return name
+    for suffix in _HISTOGRAM_SUFFIXES:
+        base = name[: -len(suffix)]
+        if name.endswith(suffix) and METRICS.get(base, ("",))[0] == "histogram":
+            return base
+    return None
+
+
+def _sort_key(sample):
+    name, labels, _ = sample
+    # le is always the last label; order buckets numerically within a series.
+    series, found, le = labels.rpartition('le="')
+    if not name.endswith("_bucket") or not found:
+        return name, labels, 0.0
+    return name, series, float(le[:-1])
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render_metrics(path):
+    """Every worker's metrics, summed, in the Prometheus text format."""
+    flush(path)
+    rows = _conn(path).execute("SELECT name, labels, value FROM metric").fetchall()
+
+    families = defaultdict(list)
+    for row in rows:
+        family = _family(row[0])
+        if family:
+            families[family].append(row)
+
+    lookups = defaultdict(float)
+    for _, labels, value in families["porahobe_presigned_url_cache_lookups_total"]:
+        lookups[labels] += value
+    total = sum(lookups.values())
+    hits = total - lookups.get('result="miss"', 0.0)
+    families["porahobe_presigned_url_cache_hit_ratio"] = [
+        ("porahobe_presigned_url_cache_hit_ratio", "", hits / total if total else 0.0)
+    ]
+
+    lines = []
+    for family, (kind, help_text) in METRICS.items():
+        lines.append(f"# HELP {family} {help_text}")
+        lines.append(f"# TYPE {family} {kind}")
+        for name, labels, value in sorted(families[family], key=_sort_key):
+            series = f"{name}{{{labels}}}" if labels else name
+            lines.append(f"{series} {_format_value(value)}")
+    return "\n".join(lines) + "\n"
+
+
+def _record_request(response):
+    started = g.get("request_started")
+    if started is None:
+        return response
+
+    blueprint = request.blueprint or "none"
+    endpoint = request.endpoint or "none"
+    inc(
+        "porahobe_http_requests_total",
+        blueprint=blueprint,
+        endpoint=endpoint,
+        method=request.method,
+        status=response.status_code,
+    )
+    observe(
+        "porahobe_http_request_duration_seconds",
+        time.perf_counter() - started,
+        blueprint=blueprint,
+        endpoint=endpoint,
+        method=request.method,
+    )
+    statements = g.get("sql_statement_count", 0)
+    if statements:
+        inc(
+            "porahobe_sql_queries_total",
+            statements,
+            blueprint=blueprint,
+            endpoint=endpoint,
+        )
+    return response
+
+
+def _flush_at_exit(path, logger):
+    try:
+        flush(path)
+    except sqlite3.Error as e:
+        logger.warning(f"Metrics flush failed: {e}")
+
+
+def init_metrics(app):
+    path = app.config["METRICS_DB_PATH"]
+    if not path:
+        return
+
+    # Durations start from the request_started time init_timing records.
+    app.after_request(_record_request)
+    atexit.register(_flush_at_exit, path, app.logger)
+
+    @app.before_request
+    def _start_metrics_flusher():
+        ensure_background_thread(
+            "metrics-flusher",
+            _run_flusher,
+            path,
+            app.config["METRICS_FLUSH_INTERVAL"],
+            app.logger,
+        )
@@ -0,0 +1,83 @@
+import hashlib
+import time
+from functools import wraps
+from typing import NamedTuple
+
+from flask import current_app, make_response, request, session
+from flask_login import current_user
+
+from app.extensions import db
+from app.models import Note, NoteType, Subject, User
+from app.utilities.cache import get_local_cache
+from app.utilities.versions import get_version, track_changes, version_time
+
+NOTES_VERSION = "notes"
+# Anything a cached note page renders from.
+_TRACKED_MODELS = (Note, Subject, NoteType, User)
+
+
+class CachedPage(NamedTuple):
+    body: bytes
+    mimetype: str
+    etag: str
+
+
+def _page_key(version):
+    user_key = (
+        (current_user.id, current_user.is_admin)
+        if current_user.is_authenticated
+        else None
+    )
+    return (
+        request.endpoint,
+        tuple(sorted((request.view_args or {}).items())),
+        tuple(sorted(request.args.items(multi=True))),
+        user_key,
+        version,
+    )
+
+
+def cached_page(view):
+    """Serve a GET view from the rendered-page cache with ETag/Last-Modified.
+
+    Entries are keyed on the route, its arguments, the viewer and the notes
+    version, so any committed change to notes or what they display makes
+    every cached page unreachable at once.
+    """
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        # A page that shows a flashed message must not be stored or replayed.
+        if request.method != "GET" or session.get("_flashes"):
+            return view(*args, **kwargs)
+
+        version = get_version(NOTES_VERSION)
+        key = _page_key(version)
+        now = time.time()
+        page_cache = get_local_cache("pages", current_app.config["PAGE_CACHE_SIZE"])
+
+        page = page_cache.get(key, now)
+        if page is None:
+            response = make_response(view(*args, **kwargs))
+            if response.status_code != 200 or response.direct_passthrough:
+                return response
+            body = response.get_data()
+            page = CachedPage(
+                body, response.mimetype, hashlib.sha1(body).hexdigest()
+            )
+            page_cache.set(key, page, now + current_app.config["PAGE_CACHE_TTL"])
+        else:
+            response = current_app.response_class(page.body, mimetype=page.mimetype)
+
+        response.set_etag(page.etag)
+        response.last_modified = version_time(version)
+        # Pages are per user and embed presigned URLs: browsers must revalidate.
+        response.cache_control.private = True
+        response.cache_control.no_cache = True
+        return response.make_conditional(request)
+
+    return wrapper
+
+
+def init_page_cache(app):
+    track_changes(_TRACKED_MODELS, NOTES_VERSION)
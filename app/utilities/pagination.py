@@ -0,0 +1,107 @@
+from typing import NamedTuple, Optional
+
+from flask import abort, redirect, request, url_for
+from sqlalchemy import and_, or_
+
+from app.extensions import db
+from app.models import Note
+
+NOTE_SORTS = {
+    "newest": (Note.created_at, True),
+    "oldest": (Note.created_at, False),
+    "title": (Note.title, False),
+}
+
+
+class KeysetPage(NamedTuple):
+    items: list
+    next_cursor: Optional[int]
+    prev_cursor: Optional[int]
+
+
+def _parse_cursor(raw):
+    try:
+        return int(raw) if raw else None
+    except (TypeError, ValueError):
+        return None
+
+
+def keyset_query(query, sort="newest", cursor_id=None, backwards=False, key=None):
+    """Order ``query`` for keyset paging and seek past ``cursor_id``."""
+    # ``key`` lets callers page on a column outside the note table (e.g. a search
+    # rank): (column, descending, id column in the same FROM as ``column``).
+    if key is None:
+        column, descending = NOTE_SORTS.get(sort, NOTE_SORTS["newest"])
+        key_id = Note.id
+    else:
+        column, descending, key_id = key
+
+    # Walking backwards flips the comparison and the order; paginate_notes
+    # reverses the rows again so templates always see display order.
+    walk_desc = descending != backwards
+    if cursor_id is not None:
+        # The boundary value is read in SQL rather than round-tripped through
+        # Python so it compares byte-for-byte with the stored column.
+        boundary = (
+            db.session.query(column)
+            .filter(key_id == cursor_id)
+            .correlate(None)
+            .scalar_subquery()
+        )
+        # The redundant inclusive bound lets the planner seek into the index
+        # instead of scanning from the start and filtering on the OR.
+        if walk_desc:
+            query = query.filter(
+                column <= boundary,
+                or_(column < boundary, and_(column == boundary, Note.id < cursor_id)),
+            )
+        else:
+            query = query.filter(
+                column >= boundary,
+                or_(column > boundary, and_(column == boundary, Note.id > cursor_id)),
+            )
+
+    if walk_desc:
+        return query.order_by(column.desc(), Note.id.desc())
+    return query.order_by(column.asc(), Note.id.asc())
+
+
+def paginate_notes(
+    query, sort="newest", after=None, before=None, per_page=30, key=None
+):
+    cursor_id = _parse_cursor(after)
+    backwards = False
+    if cursor_id is None:
+        cursor_id = _parse_cursor(before)
+        backwards = cursor_id is not None
+
+    page_query = keyset_query(query, sort, cursor_id, backwards, key)
+    rows = page_query.limit(per_page + 1).all()
+
+    if cursor_id is not None and not rows:
+        # Boundary note was deleted or the cursor is stale; send the client to
+        # the first page so the URL matches what it shows.
+        abort(redirect(page_url()))
+
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+
+    if backwards:
+        rows.reverse()
+        has_next, has_prev = True, has_more
+    else:
+        has_next, has_prev = has_more, cursor_id is not None
+
+    return KeysetPage(
+        items=rows,
+        next_cursor=rows[-1].id if rows and has_next else None,
+        prev_cursor=rows[0].id if rows and has_prev else None,
+    )
+
+
+def page_url(**cursor):
+    args = request.args.to_dict()
+    args.pop("after", None)
+    args.pop("before", None)
+    args.update({k: v for k, v in cursor.items() if v is not None})
+    return url_for(request.endpoint, **(request.view_args or {}), **args)
@@ -0,0 +1,51 @@
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+from app.extensions import db
+
+
+class QueryBudgetExceeded(RuntimeError):
+    pass
+
+
+def query_budget(limit):
+    """Override the per-request SQL statement budget for a single view."""
+
+    def decorator(f):
+        # functools.wraps copies __dict__, so this survives login_required et al.
+        f.query_budget = limit
+        return f
+
+    return decorator
+
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    if has_request_context():
+        g.sql_statement_count = g.get("sql_statement_count", 0) + 1
+
+
+def _check_budget(response):
+    view = current_app.view_functions.get(request.endpoint)
+    budget = getattr(view, "query_budget", current_app.config["SQL_QUERY_BUDGET"])
+    count = g.get("sql_statement_count", 0)
+
+    if budget and count > budget:
+        message = (
+            f"{request.method} {request.path} ({request.endpoint}) ran {count} "
+            f"SQL statements, budget is {budget}"
+        )
+        if current_app.config["SQL_QUERY_BUDGET_STRICT"] or current_app.testing:
+            raise QueryBudgetExceeded(message)
+        current_app.logger.warning(message)
+
+    return response
+
+
+def init_query_budget(app):
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _count_statement):
+            event.listen(engine, "before_cursor_execute", _count_statement)
+
+    app.after_request(_check_budget)
@@ -0,0 +1,149 @@
+import json
+import sqlite3
+import time
+from threading import Lock
+from typing import NamedTuple
+
+from flask import current_app
+
+from app.extensions import db
+from app.models import NoteType, Subject
+from app.utilities.cache import get_shared_cache
+from app.utilities.versions import bump_version, get_version
+
+REFERENCE_VERSION = "reference"
+# Old snapshots are unreachable once the version moves; let them age out.
+_SHARED_TTL_SECONDS = 24 * 3600
+
+
+class RefItem(NamedTuple):
+    id: int
+    name: str
+
+
+class _Snapshot:
+    def __init__(self, subjects, note_types):
+        self.subjects = subjects
+        self.note_types = note_types
+        self.subjects_by_id = {s.id: s for s in subjects}
+        self.note_types_by_id = {t.id: t for t in note_types}
+        self.note_types_by_name = {t.name: t for t in note_types}
+
+
+# (version, snapshot) for this worker.
+_current = (None, None)
+_lock = Lock()
+
+
+def _load_from_db():
+    return {
+        "subjects": [
+            list(row)
+            for row in Subject.query.with_entities(Subject.id, Subject.name)
+            .order_by(Subject.name.asc())
+            .all()
+        ],
+        "note_types": [
+            list(row)
+            for row in NoteType.query.with_entities(NoteType.id, NoteType.name)
+            .order_by(NoteType.name.asc())
+            .all()
+        ],
+    }
+
+
+def _load(version):
+    shared = get_shared_cache(current_app.config["SHARED_CACHE_PATH"])
+    cache_key = f"reference:{version}"
+    data = None
+    if shared is not None:
+        try:
+            row = shared.get(cache_key)
+            data = json.loads(row[0]) if row else None
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Shared reference cache read failed: {e}")
+
+    if data is None:
+        data = _load_from_db()
+        if shared is not None:
+            try:
+                shared.set(
+                    cache_key, json.dumps(data), time.time() + _SHARED_TTL_SECONDS
+                )
+            except sqlite3.Error as e:
+                current_app.logger.warning(f"Shared reference cache write failed: {e}")
+
+    return _Snapshot(
+        [RefItem(*row) for row in data["subjects"]],
+        [RefItem(*row) for row in data["note_types"]],
+    )
+
+
+def _snapshot():
+    global _current
+    # Read the version before loading, so a concurrent change can only make
+    # this snapshot newer than its version, never older.
+    version = get_version(REFERENCE_VERSION)
+    cached_version, snapshot = _current
+    if cached_version == version:
+        return snapshot
+
+    with _lock:
+        cached_version, snapshot = _current
+        if cached_version != version:
+            snapshot = _load(version)
+            _current = (version, snapshot)
+    return snapshot
+
+
+def subjects():
+    """All subjects as ``RefItem(id, name)``, ordered by name."""
+    return _snapshot().subjects
+
+
+def note_types():
+    """All note types as ``RefItem(id, name)``, ordered by name."""
+    return _snapshot().note_types
+
+
+def get_subject(subject_id):
+    try:
+        return _snapshot().subjects_by_id.get(int(subject_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def get_note_type(note_type_id):
+    try:
+        return _snapshot().note_types_by_id.get(int(note_type_id))
+    except (TypeError, ValueError):
+        return None
+
+
+def find_note_type(name):
+    return _snapshot().note_types_by_name.get(name)
+
+
+def get_or_create_note_type(name):
+    """Return ``(note_type, created)``, adding a new NoteType to the session.
+
+    When ``created`` is true, call ``invalidate_reference_data`` after commit.
+    """
+    cached = find_note_type(name)
+    if cached:
+        return cached, False
+
+    # The snapshot can trail another worker's insert by one request.
+    note_type = NoteType.query.filter_by(name=name).first()
+    if note_type:
+        return RefItem(note_type.id, note_type.name), False
+
+    note_type = NoteType(name=name)
+    db.session.add(note_type)
+    db.session.flush()
+    return RefItem(note_type.id, note_type.name), True
+
+
+def invalidate_reference_data():
+    """Call after committing any change to subjects or note types."""
+    bump_version(REFERENCE_VERSION)
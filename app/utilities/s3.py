@@ -1,44 +1,137 @@
-import mimetypes
+import hashlib
+import hmac
+import os
+import sqlite3
 import time
+from datetime import datetime, timezone
 from threading import Lock
+from urllib.parse import quote, urlsplit
 
 import boto3
 from botocore.config import Config
+from botocore.exceptions import ClientError
 from flask import current_app
-from flask_login import current_user
 
-_PRESIGNED_URL_CACHE = {}
-_CACHE_LOCK = Lock()
+from app.utilities import metrics
+from app.utilities.cache import get_local_cache, get_shared_cache
+from app.utilities.timing import timed
 
+S3_REGION = "us-east-1"
 
-def get_s3_client():
+# S3 rejects multipart parts smaller than 5 MiB (except the last one).
+S3_MIN_PART_SIZE = 5 * 1024 * 1024
+
+# Process-local LRU in front of an optional SQLite tier shared by all workers.
+# Cached URLs are only handed out while they stay valid at least this long, so
+# pages that embed them (including cached pages, see PAGE_CACHE_TTL) never
+# carry a link that is about to expire.
+PRESIGNED_URL_MIN_REMAINING = 300
+
+_S3_CLIENTS = {}
+_S3_CLIENT_LOCK = Lock()
+
+
+def _reset_s3_clients_after_fork():
+    # The lock may have been held by another thread at fork time.
+    global _S3_CLIENT_LOCK
+    _S3_CLIENT_LOCK = Lock()
+    _S3_CLIENTS.clear()
+
+
+os.register_at_fork(after_in_child=_reset_s3_clients_after_fork)
+
+
+def _build_s3_client(endpoint_url, access_key_id, secret_key, max_pool_connections):
     s3_config = Config(
         retries={"max_attempts": 3, "mode": "standard"},
         request_checksum_calculation="when_required",
         response_checksum_validation="when_required",
         s3={"addressing_style": "path"},
         signature_version="s3v4",
+        max_pool_connections=max_pool_connections,
+        tcp_keepalive=True,
     )
 
-    return boto3.client(
+    # A private Session: boto3's default session is not safe to create clients
+    # from concurrently.
+    return boto3.session.Session().client(
         "s3",
-        endpoint_url=current_app.config["S3_ENDPOINT_URL"],
-        aws_access_key_id=current_app.config["S3_ACCESS_KEY_ID"],
-        aws_secret_access_key=current_app.config["S3_SECRET_KEY"],
-        region_name="us-east-1",
+        endpoint_url=endpoint_url,
+        aws_access_key_id=access_key_id,
+        aws_secret_access_key=secret_key,
+        region_name=S3_REGION,
         config=s3_config,
     )
 
 
+def get_s3_client():
+    """Return this process's shared S3 client, creating it on first use.
+
+    boto3 clients are thread-safe, so one client (and its keep-alive connection
+    pool) serves every thread in a worker. The pid is part of the cache key so a
+    client inherited across a gunicorn fork is never reused in the child.
+    """
+    config = current_app.config
+    cache_key = (
+        os.getpid(),
+        config["S3_ENDPOINT_URL"],
+        config["S3_ACCESS_KEY_ID"],
+        config["S3_SECRET_KEY"],
+        config["S3_MAX_POOL_CONNECTIONS"],
+    )
+
+    client = _S3_CLIENTS.get(cache_key)
+    if client is None:
+        with _S3_CLIENT_LOCK:
+            client = _S3_CLIENTS.get(cache_key)
+            if client is None:
+                # Drop clients from a parent process or an older configuration.
+                _S3_CLIENTS.clear()
+                client = _build_s3_client(*cache_key[1:])
+                _S3_CLIENTS[cache_key] = client
+
+    return client
+
+
+def _url_cache():
+    return get_local_cache(
+        "presigned_urls", current_app.config["PRESIGNED_URL_CACHE_SIZE"]
+    )
+
+
+def _shared_url_cache():
+    return get_shared_cache(current_app.config["SHARED_CACHE_PATH"])
+
+
+def _count_lookups(result, count=1):
+    metrics.inc("porahobe_presigned_url_cache_lookups_total", count, result=result)
+
+
+@timed("s3")
 def generate_presigned_url(key, expiration=3600):
-    cache_key = (key, int(expiration))
+    cache_key = f"presigned:{int(expiration)}:{key}"
     now = time.time()
 
-    with _CACHE_LOCK:
-        cached = _PRESIGNED_URL_CACHE.get(cache_key)
-        if cached and cached["expires_at"] > now:
-            return cached["url"]
+    url_cache = _url_cache()
+    cached = url_cache.get(cache_key, now)
+    if cached:
+        _count_lookups("local_hit")
+        return cached
+
+    # Another worker may already have signed this key.
+    shared = _shared_url_cache()
+    if shared is not None:
+        try:
+            row = shared.get(cache_key, now)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Shared URL cache read failed: {e}")
+            row = None
+        if row:
+            url_cache.set(cache_key, row[0], row[1])
+            _count_lookups("shared_hit")
+            return row[0]
 
+    _count_lookups("miss")
     s3_client = get_s3_client()
     bucket = current_app.config["S3_BUCKET_NAME"]
 
@@ -48,39 +141,269 @@ def generate_presigned_url(key, expiration=3600):
         ExpiresIn=expiration,
     )
 
-    with _CACHE_LOCK:
-        # Keep a short buffer to avoid serving stale links close to expiry.
-        _PRESIGNED_URL_CACHE[cache_key] = {
-            "url": presigned_url,
-            "expires_at": now + max(1, int(expiration) - 30),
-        }
-        # Opportunistic cleanup to avoid unbounded growth.
-        expired_keys = [
-            k for k, v in _PRESIGNED_URL_CACHE.items() if v["expires_at"] <= now
-        ]
-        for expired_key in expired_keys:
-            _PRESIGNED_URL_CACHE.pop(expired_key, None)
+    expires_at = now + max(1, int(expiration) - PRESIGNED_URL_MIN_REMAINING)
+    url_cache.set(cache_key, presigned_url, expires_at)
+    if shared is not None:
+        try:
+            shared.set(cache_key, presigned_url, expires_at)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Shared URL cache write failed: {e}")
 
     return presigned_url
 
 
-def upload_to_s3(file, filename, content_type=None):
+def _sigv4_signing_key(secret_key, datestamp, region, service="s3"):
+    key = hmac.new(f"AWS4{secret_key}".encode(), datestamp.encode(), hashlib.sha256)
+    for part in (region, service, "aws4_request"):
+        key = hmac.new(key.digest(), part.encode(), hashlib.sha256)
+    return key.digest()
+
+
+def _presign_get_urls(keys, expiration, now=None):
+    """SigV4 query-string presigning for GET, matching botocore's output.
+
+    The signing key is derived once for the whole batch; each key then costs
+    one canonical request, one SHA-256 and one HMAC.
+    """
+    config = current_app.config
+    endpoint = config["S3_ENDPOINT_URL"].rstrip("/")
+    bucket = config["S3_BUCKET_NAME"]
+    access_key_id = config["S3_ACCESS_KEY_ID"]
+
+    parsed = urlsplit(endpoint)
+    host = parsed.hostname
+    # botocore signs the Host header without the scheme's default port.
+    if parsed.port and parsed.port != {"http": 80, "https": 443}.get(parsed.scheme):
+        host = f"{host}:{parsed.port}"
+
+    timestamp = datetime.fromtimestamp(time.time() if now is None else now, timezone.utc)
+    amz_date = timestamp.strftime("%Y%m%dT%H%M%SZ")
+    datestamp = amz_date[:8]
+    scope = f"{datestamp}/{S3_REGION}/s3/aws4_request"
+    signing_key = _sigv4_signing_key(config["S3_SECRET_KEY"], datestamp, S3_REGION)
+
+    query = "&".join(
+        f"{name}={quote(value, safe='-_.~')}"
+        for name, value in (
+            ("X-Amz-Algorithm", "AWS4-HMAC-SHA256"),
+            ("X-Amz-Credential", f"{access_key_id}/{scope}"),
+            ("X-Amz-Date", amz_date),
+            ("X-Amz-Expires", str(int(expiration))),
+            ("X-Amz-SignedHeaders", "host"),
+        )
+    )
+    string_to_sign_prefix = f"AWS4-HMAC-SHA256\n{amz_date}\n{scope}\n"
+    canonical_suffix = f"\n{query}\nhost:{host}\n\nhost\nUNSIGNED-PAYLOAD"
+
+    urls = {}
+    for key in keys:
+        path = f"/{bucket}/{quote(key, safe='/~')}"
+        canonical_request = f"GET\n{path}{canonical_suffix}"
+        string_to_sign = string_to_sign_prefix + hashlib.sha256(
+            canonical_request.encode()
+        ).hexdigest()
+        signature = hmac.new(
+            signing_key, string_to_sign.encode(), hashlib.sha256
+        ).hexdigest()
+        urls[key] = f"{endpoint}{path}?{query}&X-Amz-Signature={signature}"
+    return urls
+
+
+@timed("s3")
+def generate_presigned_urls(keys, expiration=3600):
+    """Presign many keys at once, returning ``{key: url}``.
+
+    Cached URLs are reused exactly as in ``generate_presigned_url``; the misses
+    are signed together in one batch.
+    """
+    now = time.time()
+    expires_at = now + max(1, int(expiration) - PRESIGNED_URL_MIN_REMAINING)
+    url_cache = _url_cache()
+    shared = _shared_url_cache()
+
+    urls = {}
+    missing = []
+    shared_hits = 0
+    for key in dict.fromkeys(keys):
+        cache_key = f"presigned:{int(expiration)}:{key}"
+        cached = url_cache.get(cache_key, now)
+        if cached:
+            urls[key] = cached
+            continue
+        if shared is not None:
+            try:
+                row = shared.get(cache_key, now)
+            except sqlite3.Error as e:
+                current_app.logger.warning(f"Shared URL cache read failed: {e}")
+                row = None
+            if row:
+                url_cache.set(cache_key, row[0], row[1])
+                urls[key] = row[0]
+                shared_hits += 1
+                continue
+        missing.append(key)
+
+    local_hits = len(urls) - shared_hits
+    if local_hits:
+        _count_lookups("local_hit", local_hits)
+    if shared_hits:
+        _count_lookups("shared_hit", shared_hits)
+    if not missing:
+        return urls
+
+    if not current_app.config["S3_ENDPOINT_URL"]:
+        # Without an explicit endpoint boto3 resolves AWS's own; let it. The
+        # single-key path records these lookups itself.
+        signed = {key: generate_presigned_url(key, expiration) for key in missing}
+        urls.update(signed)
+        return urls
+
+    _count_lookups("miss", len(missing))
+    signed = _presign_get_urls(missing, expiration, now)
+    for key, url in signed.items():
+        cache_key = f"presigned:{int(expiration)}:{key}"
+        url_cache.set(cache_key, url, expires_at)
+        if shared is not None:
+            try:
+                shared.set(cache_key, url, expires_at)
+            except sqlite3.Error as e:
+                current_app.logger.warning(f"Shared URL cache write failed: {e}")
+    urls.update(signed)
+    return urls
+
+
+def presigned_url_cache_stats():
+    shared = _shared_url_cache()
+    url_cache = _url_cache()
+    local_hits = url_cache.hits
+    shared_hits = shared.hits if shared is not None else 0
+    misses = shared.misses if shared is not None else url_cache.misses
+    lookups = local_hits + shared_hits + misses
+    return {
+        "local_hits": local_hits,
+        "shared_hits": shared_hits,
+        "misses": misses,
+        "hit_ratio": (local_hits + shared_hits) / lookups if lookups else 0.0,
+        "size": len(url_cache),
+    }
+
+
+def _record_upload(size, started):
+    metrics.inc("porahobe_s3_upload_bytes_total", size)
+    metrics.observe(
+        "porahobe_s3_upload_duration_seconds",
+        time.perf_counter() - started,
+        buckets=metrics.UPLOAD_BUCKETS,
+    )
+
+
+@timed("s3")
+def upload_stream(stream, key, content_type="application/octet-stream"):
+    """Upload a readable stream to ``key`` holding at most one part in memory.
+
+    Streams shorter than one part go up with a single PUT; anything larger is
+    sent as a multipart upload that is aborted if any step fails.
+    """
     s3 = get_s3_client()
     bucket = current_app.config["S3_BUCKET_NAME"]
+    part_size = max(current_app.config["S3_MULTIPART_PART_SIZE"], S3_MIN_PART_SIZE)
+    started = time.perf_counter()
 
-    if content_type is None:
-        guessed, _ = mimetypes.guess_type(filename)
-        content_type = guessed or "application/octet-stream"
+    chunk = stream.read(part_size)
+    if len(chunk) < part_size:
+        s3.put_object(Bucket=bucket, Key=key, Body=chunk, ContentType=content_type)
+        _record_upload(len(chunk), started)
+        return len(chunk)
 
-    file_content = file.read()
-    file.seek(0)
+    upload_id = s3.create_multipart_upload(
+        Bucket=bucket, Key=key, ContentType=content_type
+    )["UploadId"]
+    parts = []
+    total = 0
+    try:
+        while chunk:
+            part_number = len(parts) + 1
+            response = s3.upload_part(
+                Bucket=bucket,
+                Key=key,
+                UploadId=upload_id,
+                PartNumber=part_number,
+                Body=chunk,
+            )
+            parts.append({"ETag": response["ETag"], "PartNumber": part_number})
+            total += len(chunk)
+            chunk = stream.read(part_size)
 
-    key = f"notes/{current_user.id}/{filename}"
-    s3.put_object(
-        Bucket=bucket,
-        Key=key,
-        Body=file_content,
-        ContentType=content_type,
+        s3.complete_multipart_upload(
+            Bucket=bucket,
+            Key=key,
+            UploadId=upload_id,
+            MultipartUpload={"Parts": parts},
+        )
+    except Exception:
+        try:
+            s3.abort_multipart_upload(Bucket=bucket, Key=key, UploadId=upload_id)
+        except Exception as e:
+            current_app.logger.error(f"Failed to abort multipart upload {key}: {e}")
+        raise
+
+    _record_upload(total, started)
+    return total
+
+
+@timed("s3")
+def delete_from_s3(keys):
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+
+    s3 = get_s3_client()
+    bucket = current_app.config["S3_BUCKET_NAME"]
+    # delete_objects accepts at most 1000 keys per call.
+    for start in range(0, len(keys), 1000):
+        batch = keys[start : start + 1000]
+        s3.delete_objects(
+            Bucket=bucket,
+            Delete={"Objects": [{"Key": key} for key in batch], "Quiet": True},
+        )
+
+
+def list_s3_objects(prefix):
+    """Yield ``(key, last_modified)`` for every object under ``prefix``."""
+    paginator = get_s3_client().get_paginator("list_objects_v2")
+    for page in paginator.paginate(
+        Bucket=current_app.config["S3_BUCKET_NAME"], Prefix=prefix
+    ):
+        for obj in page.get("Contents", []):
+            yield obj["Key"], obj["LastModified"]
+
+
+@timed("s3")
+def copy_in_s3(source_key, key):
+    s3 = get_s3_client()
+    bucket = current_app.config["S3_BUCKET_NAME"]
+    s3.copy_object(
+        Bucket=bucket, Key=key, CopySource={"Bucket": bucket, "Key": source_key}
     )
 
-    return key
+
+@timed("s3")
+def download_from_s3(key, max_bytes=None):
+    s3 = get_s3_client()
+    response = s3.get_object(Bucket=current_app.config["S3_BUCKET_NAME"], Key=key)
+    size = response.get("ContentLength")
+    if max_bytes is not None and size is not None and size > max_bytes:
+        response["Body"].close()
+        raise ValueError(f"{key} is {size} bytes, the limit is {max_bytes}")
+    return response["Body"].read()
+
+
+@timed("s3")
+def object_exists(key):
+    try:
+        get_s3_client().head_object(Bucket=current_app.config["S3_BUCKET_NAME"], Key=key)
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+            return False
+        raise
+    return True
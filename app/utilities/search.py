@@ -0,0 +1,242 @@
+import re
+from threading import Lock
+
+from sqlalchemy import (
+    bindparam,
+    event,
+    false,
+    literal_column,
+    or_,
+    select,
+    table,
+    text,
+)
+from sqlalchemy.exc import OperationalError
+
+from app.extensions import db
+from app.models import Note, NoteType, Subject
+
+FTS_TABLE = "note_fts"
+FTS_DIALECTS = {"sqlite", "sqlitecloud"}
+# bm25() column weights, in FTS column order: title, description, subject, type.
+BM25_WEIGHTS = (10.0, 4.0, 2.0, 2.0)
+
+_CREATE_FTS = text(
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "title, description, subject, note_type, "
+    "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+)
+_INDEX_ROWS = (
+    f"INSERT INTO {FTS_TABLE}(rowid, title, description, subject, note_type) "
+    "SELECT note.id, note.title, COALESCE(note.description, ''), "
+    "COALESCE(subject.name, ''), COALESCE(note_type.name, '') "
+    "FROM note "
+    "LEFT JOIN subject ON subject.id = note.subject_id "
+    "LEFT JOIN note_type ON note_type.id = note.note_type_id"
+)
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# Engine URL -> True (index present), False (engine cannot host FTS5).
+# Missing means not checked yet in this process.
+_fts_state = {}
+_fts_lock = Lock()
+
+
+def _table_exists(conn, name):
+    return (
+        conn.execute(
+            text("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = :name"),
+            {"name": name},
+        ).first()
+        is not None
+    )
+
+
+def _reindex(conn, column=None, ids=None):
+    if column is None:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+        conn.execute(text(_INDEX_ROWS))
+        return
+
+    _unindex(conn, column, ids)
+    conn.execute(
+        text(f"{_INDEX_ROWS} WHERE note.{column} IN :ids").bindparams(
+            bindparam("ids", expanding=True)
+        ),
+        {"ids": sorted(ids)},
+    )
+
+
+def _unindex(conn, column, ids):
+    conn.execute(
+        text(
+            f"DELETE FROM {FTS_TABLE} WHERE rowid IN "
+            f"(SELECT id FROM note WHERE {column} IN :ids)"
+        ).bindparams(bindparam("ids", expanding=True)),
+        {"ids": sorted(ids)},
+    )
+
+
+def ensure_search_index(rebuild=False):
+    """Create and backfill the FTS5 index if this engine supports it.
+
+    Only deploy-time commands call this (`flask search rebuild`, restores);
+    requests use ``search_index_ready`` and never write to the schema.
+    """
+    engine = db.engine
+    key = str(engine.url)
+    if engine.dialect.name not in FTS_DIALECTS:
+        _fts_state[key] = False
+        return False
+
+    if _fts_state.get(key) is not None and not rebuild:
+        return _fts_state[key]
+
+    with _fts_lock:
+        if _fts_state.get(key) is not None and not rebuild:
+            return _fts_state[key]
+
+        try:
+            with engine.begin() as conn:
+                if not _table_exists(conn, Note.__tablename__):
+                    # Schema not created yet; try again on the next call.
+                    return False
+                created = not _table_exists(conn, FTS_TABLE)
+                conn.execute(_CREATE_FTS)
+                if created or rebuild:
+                    _reindex(conn)
+        except OperationalError:
+            # SQLite build without FTS5; fall back to LIKE search.
+            _fts_state[key] = False
+            return False
+
+        _fts_state[key] = True
+        return True
+
+
+def _fts_ready(conn):
+    key = str(conn.engine.url)
+    state = _fts_state.get(key)
+    if state is None and conn.dialect.name in FTS_DIALECTS:
+        # Another worker may have built the index; adopt it without creating.
+        state = _table_exists(conn, FTS_TABLE)
+        if state:
+            _fts_state[key] = True
+    return bool(state)
+
+
+def search_index_ready():
+    """Whether the FTS5 index exists, checked without creating it."""
+    engine = db.engine
+    if engine.dialect.name not in FTS_DIALECTS:
+        return False
+    if _fts_state.get(str(engine.url)):
+        return True
+    with engine.connect() as conn:
+        return _fts_ready(conn)
+
+
+def _sync_after_flush(session, flush_context):
+    note_ids, deleted_ids, subject_ids, note_type_ids = set(), set(), set(), set()
+
+    for obj in session.new:
+        if isinstance(obj, Note):
+            note_ids.add(obj.id)
+    for obj in session.dirty:
+        if not session.is_modified(obj, include_collections=False):
+            continue
+        if isinstance(obj, Note):
+            note_ids.add(obj.id)
+        elif isinstance(obj, Subject):
+            subject_ids.add(obj.id)
+        elif isinstance(obj, NoteType):
+            note_type_ids.add(obj.id)
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            deleted_ids.add(obj.id)
+
+    if not (note_ids or deleted_ids or subject_ids or note_type_ids):
+        return
+
+    conn = session.connection()
+    if not _fts_ready(conn):
+        return
+
+    if deleted_ids:
+        conn.execute(
+            text(f"DELETE FROM {FTS_TABLE} WHERE rowid IN :ids").bindparams(
+                bindparam("ids", expanding=True)
+            ),
+            {"ids": sorted(deleted_ids)},
+        )
+    if note_ids:
+        _reindex(conn, "id", note_ids)
+    if subject_ids:
+        _reindex(conn, "subject_id", subject_ids)
+    if note_type_ids:
+        _reindex(conn, "note_type_id", note_type_ids)
+
+
+def reindex_notes(column, values):
+    """Refresh index rows after a set-based UPDATE of notes by ``column``.
+
+    ``Query.update`` skips the flush, so the after_flush sync never sees it.
+    """
+    conn = db.session.connection()
+    if _fts_ready(conn):
+        _reindex(conn, column, values)
+
+
+def unindex_notes(column, values):
+    """Drop index rows for a set-based DELETE; call before deleting."""
+    conn = db.session.connection()
+    if _fts_ready(conn):
+        _unindex(conn, column, values)
+
+
+def match_expression(search):
+    # Quote every token so user input can never inject FTS5 query syntax, and
+    # make each one a prefix match so "integ" finds "integration".
+    return " ".join(f'"{token}"*' for token in _TOKEN_RE.findall(search))
+
+
+def apply_search(query, search, ranked=False):
+    """Filter a Note query by ``search``.
+
+    Returns the filtered query and, when ``ranked`` and FTS5 is available, a
+    keyset for ``paginate_notes`` that orders by BM25 relevance.
+    """
+    if search_index_ready():
+        match = match_expression(search)
+        if not match:
+            # Nothing searchable (e.g. only punctuation) matches no notes.
+            return query.filter(false()), None
+
+        weights = ", ".join(str(w) for w in BM25_WEIGHTS)
+        hits = (
+            select(
+                literal_column("rowid").label("note_id"),
+                literal_column(f"bm25({FTS_TABLE}, {weights})").label("rank"),
+            )
+            .select_from(table(FTS_TABLE))
+            .where(literal_column(FTS_TABLE).op("MATCH")(match))
+            .subquery("note_search")
+        )
+        query = query.join(hits, hits.c.note_id == Note.id)
+        # bm25() scores are negative; lower is more relevant.
+        return query, ((hits.c.rank, False, hits.c.note_id) if ranked else None)
+
+    query = query.filter(
+        or_(Note.title.ilike(f"%{search}%"), Note.description.ilike(f"%{search}%"))
+    )
+    return query, None
+
+
+def init_search(app):
+    if not event.contains(db.session, "after_flush", _sync_after_flush):
+        event.listen(db.session, "after_flush", _sync_after_flush)
+
+
+def include_object(obj, name, type_, reflected, compare_to):
+    # Keep Alembic autogenerate from dropping the FTS5 table and its shadow tables.
+    return not (type_ == "table" and reflected and name.startswith(FTS_TABLE))
@@ -0,0 +1,306 @@
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from sqlalchemy import event, func, inspect
+from sqlalchemy.dialects.sqlite import insert
+
+from app.extensions import db
+from app.models import Note, NoteType, PlatformStat, Subject, User
+from app.utilities.background import ensure_background_thread
+from app.utilities.versions import track_changes
+
+# PlatformStat scopes. "total" keys are the plural table names below.
+TOTAL = "total"
+SUBJECT = "subject"
+NOTE_TYPE = "note_type"
+UPLOADER = "user"
+DAY = "day"
+META = "meta"
+
+_TOTAL_KEYS = {
+    Note: "notes",
+    Subject: "subjects",
+    NoteType: "note_types",
+    User: "users",
+}
+_NOTE_SCOPES = (
+    (SUBJECT, "subject_id"),
+    (NOTE_TYPE, "note_type_id"),
+    (UPLOADER, "user_id"),
+)
+
+# track_changes name for set-based statements the counters do not see.
+STATS = "stats"
+
+_reconcile_now = threading.Event()
+
+
+def _note_day(note):
+    created_at = note.created_at
+    # New notes get CURRENT_TIMESTAMP (UTC) from the database on insert.
+    if not isinstance(created_at, datetime):
+        created_at = datetime.utcnow()
+    return created_at.date().isoformat()
+
+
+def _count_note(deltas, note, sign):
+    deltas[(TOTAL, "notes")] += sign
+    for scope, column in _NOTE_SCOPES:
+        value = getattr(note, column)
+        if value is not None:
+            deltas[(scope, str(value))] += sign
+    deltas[(DAY, _note_day(note))] += sign
+
+
+def _collect_deltas(session, flush_context, instances):
+    deltas = Counter()
+
+    for obj in session.new:
+        if isinstance(obj, Note):
+            _count_note(deltas, obj, 1)
+        elif type(obj) in _TOTAL_KEYS:
+            deltas[(TOTAL, _TOTAL_KEYS[type(obj)])] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Note):
+            _count_note(deltas, obj, -1)
+        elif type(obj) in _TOTAL_KEYS:
+            deltas[(TOTAL, _TOTAL_KEYS[type(obj)])] -= 1
+
+    for obj in session.dirty:
+        if not isinstance(obj, Note):
+            continue
+        state = inspect(obj)
+        for scope, column in _NOTE_SCOPES:
+            history = state.attrs[column].history
+            if not history.has_changes():
+                continue
+            for old in history.deleted:
+                if old is not None:
+                    deltas[(scope, str(old))] -= 1
+            for new in history.added:
+                if new is not None:
+                    deltas[(scope, str(new))] += 1
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        _apply_deltas(session.connection(), deltas)
+
+
+def _apply_deltas(conn, deltas):
+    table = PlatformStat.__table__
+    upsert = insert(table)
+    conn.execute(
+        upsert.on_conflict_do_update(
+            index_elements=[table.c.scope, table.c.key],
+            set_={"value": table.c.value + upsert.excluded.value},
+        ),
+        [
+            {"scope": scope, "key": key, "value": delta}
+            for (scope, key), delta in sorted(deltas.items())
+        ],
+    )
+
+
+def count_inserted_notes(rows):
+    """Count notes added with a bulk ``insert(Note)``, which skips the flush.
+
+    ``rows`` are the parameter dicts passed to the INSERT; call in the same
+    transaction.
+    """
+    deltas = Counter()
+    for row in rows:
+        _count_note(deltas, SimpleNamespace(**{"created_at": None, **row}), 1)
+    if deltas:
+        _apply_deltas(db.session.connection(), deltas)
+
+
+def count_bulk_note_change(criterion, values=None):
+    """Count a set-based DELETE, or UPDATE setting ``values``, of ``criterion``.
+
+    Call in the same transaction, before the statement runs, and run the
+    statement with ``execution_options(changes_counted=(STATS,))`` so it
+    does not also trigger a recount.
+    """
+    deltas = Counter()
+    if values is None:
+        columns = [getattr(Note, column) for _, column in _NOTE_SCOPES]
+        day = func.date(Note.created_at)
+        rows = (
+            db.session.query(*columns, day, func.count())
+            .filter(criterion)
+            .group_by(*columns, day)
+        )
+        for *scoped, day_value, count in rows:
+            deltas[(TOTAL, "notes")] -= count
+            for (scope, _), value in zip(_NOTE_SCOPES, scoped):
+                if value is not None:
+                    deltas[(scope, str(value))] -= count
+            deltas[(DAY, str(day_value))] -= count
+    else:
+        scopes = {column: scope for scope, column in _NOTE_SCOPES}
+        for column, new in values.items():
+            scope = scopes.get(column.key)
+            if scope is None:
+                continue
+            for old, count in (
+                db.session.query(column, func.count())
+                .filter(criterion, column.is_distinct_from(new))
+                .group_by(column)
+            ):
+                if old is not None:
+                    deltas[(scope, str(old))] -= count
+                deltas[(scope, str(new))] += count
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if deltas:
+        _apply_deltas(db.session.connection(), deltas)
+
+
+def _actual_counts():
+    counts = {}
+    for model, key in _TOTAL_KEYS.items():
+        counts[(TOTAL, key)] = db.session.query(func.count(model.id)).scalar()
+
+    for scope, column in _NOTE_SCOPES:
+        column = getattr(Note, column)
+        for value, count in db.session.query(column, func.count()).group_by(column):
+            counts[(scope, str(value))] = count
+
+    day = func.date(Note.created_at)
+    for value, count in db.session.query(day, func.count()).group_by(day):
+        counts[(DAY, str(value))] = count
+    return counts
+
+
+def reconcile_stats():
+    """Recount every statistic from the source tables and fix any drift.
+
+    Runs in one transaction; returns the number of rows that were wrong.
+    """
+    actual = _actual_counts()
+    stored = {
+        (row.scope, row.key): row.value
+        for row in PlatformStat.query.filter(PlatformStat.scope != META)
+    }
+
+    drift = 0
+    for key in stored.keys() - actual.keys():
+        if stored[key]:
+            drift += 1
+        PlatformStat.query.filter_by(scope=key[0], key=key[1]).delete()
+    for key, value in actual.items():
+        if stored.get(key) != value:
+            drift += 1
+            db.session.merge(PlatformStat(scope=key[0], key=key[1], value=value))
+
+    db.session.merge(
+        PlatformStat(scope=META, key="reconciled_at", value=int(time.time()))
+    )
+    db.session.commit()
+    return drift
+
+
+def _reconciled_at():
+    row = db.session.get(PlatformStat, (META, "reconciled_at"))
+    return row.value if row else None
+
+
+def uploader_note_count(user_id):
+    """Notes uploaded by ``user_id``, read from the maintained counter."""
+    row = db.session.get(PlatformStat, (UPLOADER, str(user_id)))
+    return row.value if row else 0
+
+
+def dashboard_stats(days=30, top_uploaders=10):
+    """Read the dashboard breakdowns from PlatformStat; never scans notes."""
+    if _reconciled_at() is None:
+        # Never counted from the tables yet; leave it to the reconciler.
+        _reconcile_now.set()
+
+    values = {
+        (row.scope, row.key): row.value
+        for row in PlatformStat.query.filter(
+            PlatformStat.scope.in_((TOTAL, SUBJECT, NOTE_TYPE))
+        )
+    }
+
+    uploaders = (
+        PlatformStat.query.filter(
+            PlatformStat.scope == UPLOADER, PlatformStat.value > 0
+        )
+        .order_by(PlatformStat.value.desc())
+        .limit(top_uploaders)
+        .all()
+    )
+    names = dict(
+        User.query.with_entities(User.id, User.name).filter(
+            User.id.in_([int(row.key) for row in uploaders])
+        )
+    )
+
+    start = datetime.utcnow().date() - timedelta(days=days - 1)
+    per_day = dict(
+        PlatformStat.query.with_entities(PlatformStat.key, PlatformStat.value).filter(
+            PlatformStat.scope == DAY, PlatformStat.key >= start.isoformat()
+        )
+    )
+    dates = [start + timedelta(days=i) for i in range(days)]
+
+    def _by(scope):
+        return {int(key): value for (s, key), value in values.items() if s == scope}
+
+    return {
+        "totals": {key: values.get((TOTAL, key), 0) for key in _TOTAL_KEYS.values()},
+        "by_subject": _by(SUBJECT),
+        "by_note_type": _by(NOTE_TYPE),
+        "top_uploaders": [
+            (names.get(int(row.key), f"User {row.key}"), row.value)
+            for row in uploaders
+        ],
+        "per_day": [(day, per_day.get(day.isoformat(), 0)) for day in dates],
+    }
+
+
+def _run_reconciler(app):
+    interval = app.config["STATS_RECONCILE_INTERVAL"]
+    while True:
+        try:
+            with app.app_context():
+                last = _reconciled_at()
+                # Every worker runs this loop; skip if another one just did.
+                due = last is None or time.time() - last >= interval
+                if _reconcile_now.is_set() or due:
+                    _reconcile_now.clear()
+                    drift = reconcile_stats()
+                    if drift:
+                        app.logger.warning(f"Corrected {drift} drifted statistic(s)")
+        except Exception as e:
+            app.logger.error(f"Statistics reconciliation failed: {e}")
+        _reconcile_now.wait(interval)
+
+
+def init_stats(app):
+    if not event.contains(db.session, "before_flush", _collect_deltas):
+        event.listen(db.session, "before_flush", _collect_deltas)
+    # Flushes, count_inserted_notes and count_bulk_note_change keep the
+    # counters current; any other set-based UPDATE of a counted column or
+    # DELETE is recounted in the background.
+    track_changes(
+        tuple(_TOTAL_KEYS),
+        STATS,
+        on_commit=_reconcile_now.set,
+        flushes=False,
+        bulk_inserts=False,
+        columns={column for _, column in _NOTE_SCOPES},
+    )
+
+    if not app.config["STATS_RECONCILE_INTERVAL"]:
+        return
+
+    @app.before_request
+    def _start_stats_reconciler():
+        ensure_background_thread("stats-reconciler", _run_reconciler, app)
@@ -0,0 +1,426 @@
+import hashlib
+import mimetypes
+import os
+import queue
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import NamedTuple
+
+from flask import current_app
+from sqlalchemy import insert, update
+from sqlalchemy.exc import IntegrityError
+
+from app.extensions import db
+from app.models import StoredObject
+from app.utilities.background import ensure_background_thread
+from app.utilities.s3 import (
+    copy_in_s3,
+    delete_from_s3,
+    list_s3_objects,
+    upload_stream,
+)
+from app.utilities.timing import timed
+
+HASH_CHUNK_SIZE = 1024 * 1024
+CONTENT_PREFIX = "notes/sha256/"
+STAGING_PREFIX = "uploads/staging"
+# delete_objects accepts at most this many keys per call.
+DELETE_BATCH_SIZE = 1000
+# Resized copies stored next to an original (see app.utilities.thumbnails).
+DERIVATIVES = ("thumb", "preview")
+
+
+class ContentReleased(RuntimeError):
+    """The object a file was matched to lost its last reference meanwhile."""
+
+
+class StoredFile(NamedTuple):
+    sha256: str
+    key: str
+    size: int
+    content_type: str
+    # False when an object with the same content already existed.
+    uploaded: bool
+
+
+class _HashingReader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, size):
+        data = self.stream.read(size)
+        self.sha256.update(data)
+        self.size += len(data)
+        return data
+
+
+def content_key(digest, filename):
+    ext = os.path.splitext(filename)[1].lower()
+    return f"{CONTENT_PREFIX}{digest}{ext}"
+
+
+def derivative_key(key, name):
+    return f"{os.path.splitext(key)[0]}.{name}.webp"
+
+
+def _find(digest):
+    return StoredObject.query.filter_by(sha256=digest).first()
+
+
+def _reuse(existing):
+    return StoredFile(
+        existing.sha256, existing.key, existing.size, existing.content_type, False
+    )
+
+
+def store_file(file, filename, content_type=None, reuse=True):
+    """Store ``file`` under its SHA-256, skipping the upload if it is known.
+
+    Seekable files are hashed locally first so a duplicate is never sent.
+    Streams that can only be read once are hashed while they upload to a
+    staging key, then copied into place (or dropped if the content exists).
+    The digest index is only read here; ``retain_object`` confirms the match.
+    Pass ``reuse=False`` to upload even if the content is indexed.
+    """
+    if content_type is None:
+        guessed, _ = mimetypes.guess_type(filename)
+        content_type = guessed or "application/octet-stream"
+
+    if hasattr(file, "seek"):
+        reader = _HashingReader(file)
+        while reader.read(HASH_CHUNK_SIZE):
+            pass
+        file.seek(0)
+        digest = reader.sha256.hexdigest()
+
+        existing = _find(digest) if reuse else None
+        if existing:
+            return _reuse(existing)
+
+        key = content_key(digest, filename)
+        upload_stream(file, key, content_type)
+        file.seek(0)
+        return StoredFile(digest, key, reader.size, content_type, True)
+
+    reader = _HashingReader(file)
+    staging_key = f"{STAGING_PREFIX}/{uuid.uuid4().hex}"
+    upload_stream(reader, staging_key, content_type)
+    try:
+        digest = reader.sha256.hexdigest()
+        existing = _find(digest) if reuse else None
+        if existing:
+            return _reuse(existing)
+
+        key = content_key(digest, filename)
+        copy_in_s3(staging_key, key)
+        return StoredFile(digest, key, reader.size, content_type, True)
+    finally:
+        delete_from_s3([staging_key])
+
+
+# Uploads run on pool threads outside the request; time the whole batch.
+@timed("s3")
+def store_files(files):
+    """Store ``(file, filename)`` pairs concurrently, all or nothing.
+
+    Returns ``StoredFile`` tuples in input order. If any upload fails, the
+    pending ones are cancelled, new objects nobody references are deleted and
+    the first error is re-raised.
+    """
+    app = current_app._get_current_object()
+
+    def _store(file, filename):
+        with app.app_context():
+            return store_file(file, filename)
+
+    stored = [None] * len(files)
+    error = None
+    max_workers = max(1, min(app.config["S3_UPLOAD_WORKERS"], len(files)))
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {
+            pool.submit(_store, file, filename): idx
+            for idx, (file, filename) in enumerate(files)
+        }
+        for future in as_completed(futures):
+            try:
+                stored[futures[future]] = future.result()
+            except Exception as e:
+                if error is None:
+                    error = e
+                    for pending in futures:
+                        pending.cancel()
+
+    if error is not None:
+        try:
+            discard_unreferenced(stored)
+        except Exception as e:
+            current_app.logger.error(f"Failed to clean up partial upload: {e}")
+        raise error
+
+    return stored
+
+
+def _increment(digests, count):
+    """Add ``count`` references to live objects; returns ``{sha256: key}``.
+
+    One conditional UPDATE both checks that the object is still referenced
+    and counts the new reference, so it cannot race a release of the last one.
+    """
+    rows = db.session.execute(
+        update(StoredObject)
+        .where(StoredObject.sha256.in_(digests), StoredObject.ref_count > 0)
+        .values(ref_count=StoredObject.ref_count + count)
+        .returning(StoredObject.sha256, StoredObject.key)
+        .execution_options(synchronize_session=False)
+    )
+    return dict(rows.all())
+
+
+def _drop_redundant(stored_files, keys):
+    # The same bytes uploaded under another name (a.pdf and a.txt) lost the
+    # race to be indexed; nothing can reference that copy.
+    queue_s3_deletes(
+        [
+            stored.key
+            for stored in stored_files
+            if stored.uploaded and keys.get(stored.sha256) != stored.key
+        ]
+    )
+
+
+def retain_object(stored):
+    """Count one more note using ``stored``, in the current transaction.
+
+    Returns the key the note must link to, which is the indexed object for
+    this content and may differ from ``stored.key``. Raises
+    ``ContentReleased`` if ``stored`` reused an object that was released
+    since; store the file again with ``reuse=False``.
+    """
+    keys = _increment([stored.sha256], 1)
+    if not keys:
+        if not stored.uploaded:
+            raise ContentReleased(stored.key)
+        try:
+            with db.session.begin_nested():
+                db.session.add(
+                    StoredObject(
+                        sha256=stored.sha256,
+                        key=stored.key,
+                        size=stored.size,
+                        content_type=stored.content_type,
+                        ref_count=1,
+                    )
+                )
+            keys = {stored.sha256: stored.key}
+        except IntegrityError:
+            # Another request indexed the same content first.
+            keys = _increment([stored.sha256], 1)
+            if not keys:
+                raise ContentReleased(stored.key)
+
+    _drop_redundant([stored], keys)
+    return keys[stored.sha256]
+
+
+def retain_objects(stored_files):
+    """Batched ``retain_object``: one reference per entry of ``stored_files``.
+
+    Known content is incremented with one UPDATE per distinct count and new
+    content is indexed with a single executemany INSERT. Returns
+    ``{sha256: key}`` with the key each note must link to.
+    """
+    counts = Counter(stored.sha256 for stored in stored_files)
+    if not counts:
+        return {}
+    # Index an uploaded copy when there is one.
+    by_digest = {}
+    for stored in stored_files:
+        if stored.uploaded or stored.sha256 not in by_digest:
+            by_digest[stored.sha256] = stored
+
+    by_count = defaultdict(list)
+    for digest, count in counts.items():
+        by_count[count].append(digest)
+    keys = {}
+    for count, digests in by_count.items():
+        keys.update(_increment(digests, count))
+
+    new = [digest for digest in counts if digest not in keys]
+    released = [by_digest[d].key for d in new if not by_digest[d].uploaded]
+    if released:
+        raise ContentReleased(", ".join(released))
+
+    if new:
+        try:
+            with db.session.begin_nested():
+                db.session.execute(
+                    insert(StoredObject),
+                    [
+                        {
+                            "sha256": digest,
+                            "key": by_digest[digest].key,
+                            "size": by_digest[digest].size,
+                            "content_type": by_digest[digest].content_type,
+                            "ref_count": counts[digest],
+                        }
+                        for digest in new
+                    ],
+                )
+            keys.update((digest, by_digest[digest].key) for digest in new)
+        except IntegrityError:
+            # Another request indexed some of the same content first.
+            for digest in new:
+                keys[digest] = retain_object(by_digest[digest])
+                for _ in range(counts[digest] - 1):
+                    retain_object(by_digest[digest])
+
+    _drop_redundant(stored_files, keys)
+    return keys
+
+
+def release_objects(keys):
+    """Drop one reference per key, in the current transaction.
+
+    Returns the keys no note uses any more, with their derivatives; pass
+    them to ``queue_s3_deletes`` once the transaction has committed.
+    Keys that are not in the index (external links, legacy uploads) are
+    ignored.
+    """
+    counts = Counter(key for key in keys if key)
+    if not counts:
+        return []
+
+    # One UPDATE per distinct count, so releasing a whole batch of notes is
+    # usually a single statement.
+    by_count = defaultdict(list)
+    for key, count in counts.items():
+        by_count[count].append(key)
+    for count, count_keys in by_count.items():
+        StoredObject.query.filter(StoredObject.key.in_(count_keys)).update(
+            {StoredObject.ref_count: StoredObject.ref_count - count},
+            synchronize_session=False,
+        )
+
+    unused = StoredObject.query.filter(
+        StoredObject.key.in_(counts), StoredObject.ref_count <= 0
+    )
+    orphaned = [key for (key,) in unused.with_entities(StoredObject.key)]
+    if orphaned:
+        unused.delete(synchronize_session=False)
+    return orphaned + [
+        derivative_key(key, name) for key in orphaned for name in DERIVATIVES
+    ]
+
+
+def discard_unreferenced(stored_files):
+    """Delete objects uploaded by a failed request that nothing indexed.
+
+    Another request may be uploading the same content, so this goes through
+    the delayed, re-checked delete queue rather than deleting right away.
+    """
+    queue_s3_deletes(
+        sorted({s.key for s in stored_files if s is not None and s.uploaded})
+    )
+
+
+_pending_deletes = queue.Queue()
+
+
+def _run_delete_worker(app):
+    delay = app.config["S3_DELETE_DELAY_SECONDS"]
+    while True:
+        due, key = _pending_deletes.get()
+        keys = [key]
+        # Drain whatever queued up meanwhile so one call covers many notes.
+        while len(keys) < DELETE_BATCH_SIZE:
+            try:
+                due, key = _pending_deletes.get_nowait()
+            except queue.Empty:
+                break
+            keys.append(key)
+        # Entries come out in queue order, so the last one is due last.
+        time.sleep(max(0.0, min(due - time.monotonic(), delay)))
+        try:
+            with app.app_context():
+                delete_from_s3(_unreferenced(keys))
+        except Exception as e:
+            app.logger.error(f"Deleting {len(keys)} unreferenced object(s) failed: {e}")
+
+
+def queue_s3_deletes(keys):
+    """Delete unreferenced keys in the background after a short delay.
+
+    Call after commit. Keys that are indexed again by the time the delay is
+    up (the same content uploaded meanwhile) are kept. Work queued here is
+    lost on restart; ``flask storage sweep`` removes anything that was missed.
+    """
+    keys = [key for key in keys if key]
+    if not keys:
+        return
+
+    due = time.monotonic() + current_app.config["S3_DELETE_DELAY_SECONDS"]
+    for key in keys:
+        _pending_deletes.put((due, key))
+    ensure_background_thread(
+        "s3-delete-worker", _run_delete_worker, current_app._get_current_object()
+    )
+
+
+def _content_digest(key):
+    # notes/sha256/<digest>.pdf and its notes/sha256/<digest>.thumb.webp both
+    # belong to <digest>.
+    return key[len(CONTENT_PREFIX) :].split(".", 1)[0]
+
+
+def _is_derivative(key):
+    return any(key.endswith(f".{name}.webp") for name in DERIVATIVES)
+
+
+def _unreferenced(keys):
+    """The keys in ``keys`` that no StoredObject row accounts for."""
+    digests = {_content_digest(key) for key in keys}
+    indexed = dict(
+        db.session.query(StoredObject.sha256, StoredObject.key).filter(
+            StoredObject.sha256.in_(digests)
+        )
+    )
+    indexed_keys = set(indexed.values())
+    # An original must be the indexed key itself: the same content under
+    # another extension is a redundant copy. Derivatives follow the digest.
+    return [
+        key
+        for key in keys
+        if key not in indexed_keys
+        and not (_is_derivative(key) and _content_digest(key) in indexed)
+    ]
+
+
+def sweep_orphaned_objects(min_age_seconds=24 * 3600, dry_run=False):
+    """Delete stored objects no StoredObject row accounts for.
+
+    Covers content whose release was never processed and staging uploads
+    left behind by a crashed request. Objects younger than
+    ``min_age_seconds`` are skipped: a request may still be about to index
+    them. Returns the orphaned keys.
+    """
+    cutoff = datetime.now(timezone.utc) - timedelta(seconds=min_age_seconds)
+    orphaned = [
+        key
+        for key, modified in list_s3_objects(f"{STAGING_PREFIX}/")
+        if modified < cutoff
+    ]
+
+    candidates = [
+        key for key, modified in list_s3_objects(CONTENT_PREFIX) if modified < cutoff
+    ]
+    for start in range(0, len(candidates), DELETE_BATCH_SIZE):
+        orphaned.extend(_unreferenced(candidates[start : start + DELETE_BATCH_SIZE]))
+
+    if not dry_run:
+        delete_from_s3(orphaned)
+    return orphaned
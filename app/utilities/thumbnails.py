@@ -0,0 +1,95 @@
+import io
+import os
+import queue
+
+from flask import current_app
+from PIL import Image, ImageOps
+
+from app.extensions import db
+from app.models import Note
+from app.utilities.background import ensure_background_thread
+from app.utilities.s3 import download_from_s3, object_exists, upload_stream
+from app.utilities.storage import derivative_key
+
+# Formats Pillow can decode; SVG notes keep being served as-is.
+RASTER_EXTENSIONS = {"jpg", "jpeg", "png", "gif", "webp", "bmp"}
+# Longest edge in pixels, largest first: each size is resized from the last.
+DERIVATIVE_SIZES = (("preview", 1280), ("thumb", 320))
+WEBP_QUALITY = 80
+
+_pending = queue.Queue()
+
+
+def needs_thumbnails(note):
+    if note.original_link or not note.link or note.thumbnail_key:
+        return False
+    ext = os.path.splitext(note.link)[1].lstrip(".").lower()
+    return ext in RASTER_EXTENSIONS
+
+
+def render_derivatives(data):
+    """Return ``{name: webp_bytes}`` for every entry in ``DERIVATIVE_SIZES``."""
+    largest = DERIVATIVE_SIZES[0][1]
+    rendered = {}
+    with Image.open(io.BytesIO(data)) as image:
+        # JPEGs decode straight at a reduced scale, which is most of the win.
+        image.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("RGBA" if image.has_transparency_data else "RGB")
+        for name, size in DERIVATIVE_SIZES:
+            image.thumbnail((size, size), Image.Resampling.LANCZOS)
+            buffer = io.BytesIO()
+            image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+            rendered[name] = buffer.getvalue()
+    return rendered
+
+
+def generate_thumbnails(note_id):
+    note = db.session.get(Note, note_id)
+    if note is None or not needs_thumbnails(note):
+        return False
+
+    source_key = note.link
+    keys = {name: derivative_key(source_key, name) for name, _ in DERIVATIVE_SIZES}
+    # Deduplicated uploads share an original, so its derivatives may exist.
+    if not all(object_exists(key) for key in keys.values()):
+        data = download_from_s3(
+            source_key, max_bytes=current_app.config["THUMBNAIL_MAX_SOURCE_BYTES"]
+        )
+        for name, webp in render_derivatives(data).items():
+            upload_stream(io.BytesIO(webp), keys[name], "image/webp")
+
+    # Skip notes whose file was replaced while we were rendering.
+    Note.query.filter_by(id=note_id, link=source_key).update(
+        {Note.thumbnail_key: keys["thumb"], Note.preview_key: keys["preview"]},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    return True
+
+
+def _run_worker(app):
+    while True:
+        note_id = _pending.get()
+        try:
+            with app.app_context():
+                generate_thumbnails(note_id)
+        except Exception as e:
+            app.logger.error(f"Thumbnail generation for note {note_id} failed: {e}")
+
+
+def queue_thumbnails(notes):
+    """Render thumbnails for image notes in the background, after commit.
+
+    Work queued here is lost on restart; ``flask thumbnails backfill`` picks
+    up anything that was missed.
+    """
+    note_ids = [note.id for note in notes if needs_thumbnails(note)]
+    if not note_ids:
+        return
+
+    for note_id in note_ids:
+        _pending.put(note_id)
+    ensure_background_thread(
+        "thumbnail-worker", _run_worker, current_app._get_current_object()
+    )
@@ -0,0 +1,149 @@
+import time
+from functools import wraps
+
+from flask import (
+    before_render_template,
+    current_app,
+    g,
+    has_request_context,
+    request,
+    template_rendered,
+)
+from sqlalchemy import event
+
+from app.extensions import db
+
+# Server-Timing metric names, in header order.
+CATEGORIES = ("sql", "s3", "http", "render")
+
+
+def _timings():
+    if not has_request_context():
+        return None
+    return g.get("request_timings")
+
+
+def record(category, seconds):
+    """Add one call of ``seconds`` to ``category`` for the current request."""
+    timings = _timings()
+    if timings is not None:
+        entry = timings.setdefault(category, [0.0, 0])
+        entry[0] += seconds
+        entry[1] += 1
+
+
+def timed(category):
+    """Count the wrapped call's wall time under ``category`` in Server-Timing.
+
+    Calls outside a request (background workers, CLI) are not recorded.
+    """
+
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            timings = _timings()
+            # A helper that calls another timed helper (a batch presign
+            # falling back to single ones) is counted once, by the outer call.
+            if timings is None or category in g.timing_active:
+                return f(*args, **kwargs)
+
+            g.timing_active.add(category)
+            started = time.perf_counter()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                g.timing_active.discard(category)
+                record(category, time.perf_counter() - started)
+
+        wrapper.request_timing = category
+        return wrapper
+
+    return decorator
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    # On the execution context, which is dropped with the statement even when
+    # it raises and after_cursor_execute never runs.
+    if context is not None and _timings() is not None:
+        context.timing_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "timing_started", None)
+    if started is not None:
+        record("sql", time.perf_counter() - started)
+
+
+def _render_started(sender, template, context, **extra):
+    if _timings() is not None:
+        g.setdefault("render_started", []).append(time.perf_counter())
+
+
+def _render_finished(sender, template, context, **extra):
+    started = g.get("render_started") if has_request_context() else None
+    if started:
+        record("render", time.perf_counter() - started.pop())
+
+
+def _start_request_timing():
+    g.request_timings = {}
+    g.timing_active = set()
+    g.request_started = time.perf_counter()
+
+
+def _breakdown(timings):
+    return [
+        (name, timings[name][0] * 1000, timings[name][1])
+        for name in CATEGORIES
+        if name in timings
+    ]
+
+
+def _finish_request_timing(response):
+    timings = g.pop("request_timings", None)
+    if timings is None:
+        return response
+
+    total_ms = (time.perf_counter() - g.request_started) * 1000
+    breakdown = _breakdown(timings)
+
+    if current_app.config["SERVER_TIMING_ENABLED"]:
+        metrics = [
+            f'{name};dur={ms:.1f};desc="{count} call{"s" if count != 1 else ""}"'
+            for name, ms, count in breakdown
+        ]
+        metrics.append(f"total;dur={total_ms:.1f}")
+        response.headers.add("Server-Timing", ", ".join(metrics))
+
+    slow_ms = current_app.config["SLOW_REQUEST_MS"]
+    if slow_ms and total_ms >= slow_ms:
+        parts = ", ".join(
+            f"{name} {ms:.0f} ms/{count}" for name, ms, count in breakdown
+        )
+        current_app.logger.warning(
+            f"Slow request: {request.method} {request.path} ({request.endpoint}) "
+            f"{response.status_code} took {total_ms:.0f} ms "
+            f"[{parts or 'no instrumented work'}]"
+        )
+    return response
+
+
+def init_timing(app):
+    # Register before the other hooks: before_request functions run in order
+    # and after_request functions in reverse, so this one brackets them all.
+    app.before_request(_start_request_timing)
+    app.after_request(_finish_request_timing)
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    # Every bind, including the SQLite read pool GET requests use.
+    for engine in engines:
+        for name, listener in (
+            ("before_cursor_execute", _before_cursor_execute),
+            ("after_cursor_execute", _after_cursor_execute),
+        ):
+            if not event.contains(engine, name, listener):
+                event.listen(engine, name, listener)
+
+    before_render_template.connect(_render_started, app)
+    template_rendered.connect(_render_finished, app)
@@ -0,0 +1,47 @@
+import time
+
+from flask import current_app
+from sqlalchemy.orm import make_transient_to_detached
+
+from app.extensions import db
+from app.models import User
+from app.utilities.cache import get_local_cache
+from app.utilities.versions import get_version, track_changes
+
+USERS_VERSION = "users"
+
+
+def load_cached_user(user_id):
+    """Flask-Login user loader that skips the database on a warm cache.
+
+    Cached column values are attached to the session with
+    ``merge(load=False)``, so the result behaves like a loaded ``User``:
+    attribute changes are flushed and relationships lazy-load as usual.
+    Any committed change to a user bumps a shared version that invalidates
+    every worker's entries.
+    """
+    user_id = int(user_id)
+    version = get_version(USERS_VERSION)
+    now = time.time()
+
+    # user id -> (users version, column values), per worker.
+    user_cache = get_local_cache("users", current_app.config["USER_CACHE_SIZE"])
+    entry = user_cache.get(user_id, now)
+    if entry is not None and entry[0] == version:
+        user = User(**entry[1])
+        make_transient_to_detached(user)
+        return db.session.merge(user, load=False)
+
+    user = db.session.get(User, user_id)
+    if user is not None:
+        values = {column: getattr(user, column) for column in User.__table__.c.keys()}
+        user_cache.set(
+            user_id, (version, values), now + current_app.config["USER_CACHE_TTL"]
+        )
+    return user
+
+
+def init_user_cache(app):
+    # Role changes (admin.toggle_admin, admin.verify) and profile edits all
+    # commit a modified User, which is what invalidates the cache.
+    track_changes(User, USERS_VERSION)
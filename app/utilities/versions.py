@@ -0,0 +1,131 @@
+import sqlite3
+import time
+from datetime import datetime, timezone
+from itertools import chain
+
+from flask import current_app
+from sqlalchemy import event
+
+from app.extensions import db
+from app.utilities.cache import get_shared_cache
+
+# Versions never expire on their own; they are only replaced by a bump.
+_NEVER = 1e18
+
+# Per-process fallback when SHARED_CACHE_PATH is unset.
+_local_versions = {}
+
+# Names already passed to track_changes; listeners are registered once.
+_tracked = set()
+
+
+def _new_version():
+    # A timestamp rather than a counter: bumping needs no read-modify-write,
+    # and the version doubles as a Last-Modified time.
+    return str(time.time_ns())
+
+
+def get_version(name):
+    """Return the current version token for ``name``, shared by all workers."""
+    shared = get_shared_cache(current_app.config["SHARED_CACHE_PATH"])
+    if shared is not None:
+        try:
+            row = shared.get(f"version:{name}")
+            if row:
+                return row[0]
+            version = _new_version()
+            shared.set(f"version:{name}", version, _NEVER)
+            return version
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Shared version read failed: {e}")
+
+    return _local_versions.setdefault(name, _new_version())
+
+
+def bump_version(name):
+    version = _new_version()
+    _local_versions[name] = version
+    shared = get_shared_cache(current_app.config["SHARED_CACHE_PATH"])
+    if shared is not None:
+        try:
+            shared.set(f"version:{name}", version, _NEVER)
+        except sqlite3.Error as e:
+            current_app.logger.warning(f"Shared version write failed: {e}")
+    return version
+
+
+def version_time(version):
+    return datetime.fromtimestamp(int(version) / 1e9, tz=timezone.utc)
+
+
+def _updated_columns(statement):
+    # None when the SET clause cannot be read (e.g. ordered_values()).
+    values = getattr(statement, "_values", None)
+    if not values:
+        return None
+    return {getattr(column, "key", column) for column in values}
+
+
+def track_changes(
+    models, name, on_commit=None, flushes=True, bulk_inserts=True, columns=None
+):
+    """Bump version ``name`` after every commit that changed one of ``models``.
+
+    A change is noted on the session when a flush writes a new, modified or
+    deleted instance (unless ``flushes`` is false) or a set-based INSERT
+    (unless ``bulk_inserts`` is false), UPDATE or DELETE runs; a rollback of
+    the whole transaction forgets it. With ``columns``, a set-based UPDATE
+    only counts if it sets one of them. Statements run with
+    ``execution_options(changes_counted=(name, ...))`` are skipped, for
+    callers that account for the change themselves. ``on_commit`` replaces
+    the bump.
+    """
+    if name in _tracked:
+        return
+    _tracked.add(name)
+    flag = f"{name}_changed"
+
+    def _mark_flush(session, flush_context):
+        for obj in chain(session.new, session.dirty, session.deleted):
+            if isinstance(obj, models) and (
+                obj not in session.dirty
+                or session.is_modified(obj, include_collections=False)
+            ):
+                session.info[flag] = True
+                return
+
+    def _mark_bulk(orm_execute_state):
+        if not (
+            (bulk_inserts and orm_execute_state.is_insert)
+            or orm_execute_state.is_update
+            or orm_execute_state.is_delete
+        ):
+            return
+        if name in orm_execute_state.execution_options.get("changes_counted", ()):
+            return
+        if columns is not None and orm_execute_state.is_update:
+            updated = _updated_columns(orm_execute_state.statement)
+            if updated is not None and updated.isdisjoint(columns):
+                return
+        mapper = orm_execute_state.bind_mapper
+        if mapper is not None and issubclass(mapper.class_, models):
+            orm_execute_state.session.info[flag] = True
+
+    def _after_commit(session):
+        if session.info.pop(flag, False):
+            if on_commit is None:
+                bump_version(name)
+            else:
+                on_commit()
+
+    def _after_rollback(session, previous_transaction):
+        # after_rollback also fires for savepoints, whose enclosing
+        # transaction may still commit the change.
+        if previous_transaction.parent is None:
+            session.info.pop(flag, None)
+
+    if flushes:
+        event.listen(db.session, "after_flush", _mark_flush)
+    event.listen(db.session, "do_orm_execute", _mark_bulk)
+    event.listen(db.session, "after_commit", _after_commit)
+    event.listen(db.session, "after_soft_rollback", _after_rollback)
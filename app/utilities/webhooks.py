@@ -0,0 +1,199 @@
+import json
+import os
+import random
+import sqlite3
+import threading
+import time
+
+import requests
+from flask import current_app
+
+from app.utilities import metrics
+from app.utilities.background import ensure_background_thread
+
+# Discord accepts at most 10 embeds per webhook message.
+MAX_EMBEDS_PER_MESSAGE = 10
+MAX_ATTEMPTS = 8
+MAX_BACKOFF_SECONDS = 300
+# A claimed batch is invisible to other workers for this long; if the claiming
+# worker dies mid-send the rows become due again afterwards.
+CLAIM_SECONDS = 60
+
+_OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS webhook_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    url TEXT NOT NULL,
+    embed TEXT NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at REAL NOT NULL,
+    created_at REAL NOT NULL
+)
+"""
+
+_wakeup = threading.Event()
+
+
+def _connect(path):
+    conn = sqlite3.connect(path, timeout=10, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(_OUTBOX_SCHEMA)
+    return conn
+
+
+def enqueue_embeds(url, embeds):
+    """Persist embeds to the outbox and wake the dispatcher; never blocks on HTTP."""
+    if not url or not embeds:
+        return
+
+    now = time.time()
+    conn = _connect(current_app.config["WEBHOOK_OUTBOX_PATH"])
+    try:
+        conn.executemany(
+            "INSERT INTO webhook_outbox (url, embed, next_attempt_at, created_at) "
+            "VALUES (?, ?, ?, ?)",
+            [(url, json.dumps(embed), now, now) for embed in embeds],
+        )
+    finally:
+        conn.close()
+
+    ensure_dispatcher(current_app._get_current_object())
+    _wakeup.set()
+
+
+def _claim_batch(conn):
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT url FROM webhook_outbox WHERE next_attempt_at <= ? "
+            "ORDER BY id LIMIT 1",
+            (now,),
+        ).fetchone()
+        if row is None:
+            conn.execute("COMMIT")
+            return None, []
+
+        url = row[0]
+        rows = conn.execute(
+            "SELECT id, embed, attempts FROM webhook_outbox "
+            "WHERE url = ? AND next_attempt_at <= ? ORDER BY id LIMIT ?",
+            (url, now, MAX_EMBEDS_PER_MESSAGE),
+        ).fetchall()
+        conn.executemany(
+            "UPDATE webhook_outbox SET next_attempt_at = ? WHERE id = ?",
+            [(now + CLAIM_SECONDS, row_id) for row_id, _, _ in rows],
+        )
+        conn.execute("COMMIT")
+        return url, rows
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+
+def _retry_after(response):
+    try:
+        return float(response.json().get("retry_after"))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return 1.0
+
+
+def _send_batch(conn, url, rows, logger):
+    ids = [row_id for row_id, _, _ in rows]
+    placeholders = ", ".join("?" for _ in ids)
+    payload = {"embeds": [json.loads(embed) for _, embed, _ in rows]}
+
+    try:
+        response = requests.post(url, json=payload, timeout=10)
+    except requests.RequestException as e:
+        response = None
+        error = str(e)
+    else:
+        error = f"HTTP {response.status_code}"
+
+    if response is not None and response.ok:
+        conn.execute(f"DELETE FROM webhook_outbox WHERE id IN ({placeholders})", ids)
+        metrics.inc("porahobe_webhook_sends_total", outcome="sent")
+        return
+
+    if response is not None and response.status_code == 429:
+        # Rate limited: wait exactly as long as Discord asks, without counting
+        # it as a failed attempt.
+        delay = _retry_after(response)
+        conn.execute(
+            "UPDATE webhook_outbox SET next_attempt_at = ? WHERE url = ?",
+            (time.time() + delay, url),
+        )
+        logger.warning(f"Discord webhook rate limited, retrying in {delay:.1f}s")
+        metrics.inc("porahobe_webhook_sends_total", outcome="rate_limited")
+        return
+
+    permanent = response is not None and 400 <= response.status_code < 500
+    attempts = max(a for _, _, a in rows) + 1
+    if permanent or attempts >= MAX_ATTEMPTS:
+        conn.execute(f"DELETE FROM webhook_outbox WHERE id IN ({placeholders})", ids)
+        logger.error(f"Dropping {len(ids)} Discord webhook embed(s) after {error}")
+        metrics.inc("porahobe_webhook_sends_total", outcome="dropped")
+        return
+
+    delay = min(MAX_BACKOFF_SECONDS, 2**attempts) * random.uniform(0.5, 1.0)
+    conn.execute(
+        f"UPDATE webhook_outbox SET attempts = ?, next_attempt_at = ? "
+        f"WHERE id IN ({placeholders})",
+        [attempts, time.time() + delay, *ids],
+    )
+    logger.warning(f"Discord webhook failed ({error}), retry {attempts} in {delay:.0f}s")
+    metrics.inc("porahobe_webhook_sends_total", outcome="retry")
+
+
+def _next_wakeup(conn):
+    row = conn.execute("SELECT MIN(next_attempt_at) FROM webhook_outbox").fetchone()
+    if row[0] is None:
+        return None
+    return max(0.0, row[0] - time.time())
+
+
+def _run_dispatcher(path, poll_interval, logger):
+    conn = _connect(path)
+    while True:
+        # Cleared before looking at the outbox so an enqueue that lands while a
+        # batch is in flight still wakes the next wait() immediately.
+        _wakeup.clear()
+        try:
+            url, rows = _claim_batch(conn)
+            if rows:
+                _send_batch(conn, url, rows, logger)
+                continue
+
+            timeout = _next_wakeup(conn)
+            timeout = poll_interval if timeout is None else min(timeout, poll_interval)
+        except Exception as e:
+            logger.error(f"Discord webhook dispatcher error: {e}")
+            timeout = poll_interval
+
+        _wakeup.wait(timeout)
+
+
+def ensure_dispatcher(app):
+    ensure_background_thread(
+        "discord-webhook-dispatcher",
+        _run_dispatcher,
+        app.config["WEBHOOK_OUTBOX_PATH"],
+        app.config["WEBHOOK_POLL_INTERVAL"],
+        app.logger,
+    )
+
+
+def init_webhooks(app):
+    if not app.config.get("DISCORD_WEBHOOK_URL"):
+        return
+
+    os.makedirs(os.path.dirname(app.config["WEBHOOK_OUTBOX_PATH"]) or ".", exist_ok=True)
+
+    @app.before_request
+    def _start_webhook_dispatcher():
+        # Cheap pid/liveness check; drains embeds left over from a previous run.
+        ensure_dispatcher(app)
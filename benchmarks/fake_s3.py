@@ -0,0 +1,93 @@
+import io
+import threading
+from datetime import datetime, timezone
+
+from botocore.exceptions import ClientError
+
+
+class FakeS3:
+    """In-process stand-in for the boto3 S3 client calls the app makes.
+
+    Objects live in a dict, so benchmarks measure the app rather than the
+    network. Only the operations used by ``app.utilities.s3`` are provided.
+    """
+
+    def __init__(self):
+        self.objects = {}
+        self._uploads = {}
+        self._lock = threading.Lock()
+
+    def _not_found(self, operation):
+        return ClientError({"Error": {"Code": "404"}}, operation)
+
+    def put_object(self, Bucket, Key, Body, **kwargs):
+        data = Body.read() if hasattr(Body, "read") else bytes(Body)
+        with self._lock:
+            self.objects[Key] = (data, datetime.now(timezone.utc))
+        return {}
+
+    def create_multipart_upload(self, Bucket, Key, **kwargs):
+        with self._lock:
+            upload_id = str(len(self._uploads) + 1)
+            self._uploads[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    def upload_part(self, Bucket, Key, UploadId, PartNumber, Body, **kwargs):
+        with self._lock:
+            self._uploads[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        with self._lock:
+            parts = self._uploads.pop(UploadId)
+            data = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+            self.objects[Key] = (data, datetime.now(timezone.utc))
+        return {}
+
+    def abort_multipart_upload(self, Bucket, Key, UploadId):
+        with self._lock:
+            self._uploads.pop(UploadId, None)
+        return {}
+
+    def copy_object(self, Bucket, Key, CopySource, **kwargs):
+        with self._lock:
+            if CopySource["Key"] not in self.objects:
+                raise self._not_found("CopyObject")
+            self.objects[Key] = self.objects[CopySource["Key"]]
+        return {}
+
+    def head_object(self, Bucket, Key):
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise self._not_found("HeadObject")
+        return {"ContentLength": len(obj[0]), "LastModified": obj[1]}
+
+    def get_object(self, Bucket, Key):
+        obj = self.objects.get(Key)
+        if obj is None:
+            raise self._not_found("GetObject")
+        return {"Body": io.BytesIO(obj[0]), "ContentLength": len(obj[0])}
+
+    def delete_objects(self, Bucket, Delete):
+        with self._lock:
+            for obj in Delete["Objects"]:
+                self.objects.pop(obj["Key"], None)
+        return {}
+
+    def generate_presigned_url(self, ClientMethod, Params, ExpiresIn=3600):
+        url = f"https://s3.invalid/{Params['Bucket']}/{Params['Key']}"
+        return f"{url}?X-Amz-Expires={ExpiresIn}"
+
+    def get_paginator(self, operation):
+        fake = self
+
+        class _Paginator:
+            def paginate(self, Bucket, Prefix=""):
+                contents = [
+                    {"Key": key, "LastModified": modified, "Size": len(data)}
+                    for key, (data, modified) in sorted(fake.objects.items())
+                    if key.startswith(Prefix)
+                ]
+                yield {"Contents": contents}
+
+        return _Paginator()
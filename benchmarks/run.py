@@ -0,0 +1,348 @@
+"""Benchmark the hot routes against a seeded local SQLite database.
+
+    python -m benchmarks.run --notes 1000 10000 100000 --output bench.json
+    python -m benchmarks.run --compare before.json after.json
+
+Each dataset size runs in a fresh process with its own database, S3 is an
+in-process fake and the client logs in through ``login()`` rather than OAuth.
+For every route the result records latency percentiles, SQL statements per
+request and the peak Python memory allocated while serving one request.
+"""
+
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+SEED = 1234
+SUBJECTS = 30
+NOTES_PER_USER = 50
+SEED_CHUNK_SIZE = 5000
+# File, image and external-link notes, in roughly the production mix.
+LINK_KINDS = ("pdf", "pdf", "png", "url")
+
+
+def _configure_environment(workdir):
+    # Config reads the environment when it is first imported.
+    os.environ.update(
+        {
+            "DATABASE_URL": f"sqlite:///{workdir}/bench.db",
+            "SHARED_CACHE_PATH": "",
+            "WEBHOOK_OUTBOX_PATH": f"{workdir}/outbox.db",
+            "METRICS_DB_PATH": f"{workdir}/metrics.db",
+            "S3_BUCKET_NAME": "bench",
+            "S3_ENDPOINT": "http://s3.invalid",
+            "S3_ACCESS_KEY_ID": "bench",
+            "S3_SECRET_KEY": "bench",
+            "GOOGLE_CLIENT_ID": "bench",
+            "GOOGLE_CLIENT_SECRET": "bench",
+            "DISCORD_CLIENT_ID": "bench",
+            "DISCORD_CLIENT_SECRET": "bench",
+            "DISCORD_WEBHOOK_URL": "",
+            "IMPORT_WORKER_IN_PROCESS": "0",
+            "STATS_RECONCILE_INTERVAL": "0",
+            # The benchmark reports statement counts itself.
+            "SQL_QUERY_BUDGET": "0",
+        }
+    )
+
+
+def login(client, user_id):
+    """Test-only login: put the user straight into the Flask-Login session."""
+    with client.session_transaction() as session:
+        session["_user_id"] = str(user_id)
+        session["_fresh"] = True
+
+
+def seed(n_notes, n_users):
+    """Insert users, subjects and notes with executemany; returns note ids."""
+    from app.extensions import db
+    from app.models import Note, NoteType, Subject, User
+    from app.utilities.search import ensure_search_index
+    from app.utilities.stats import reconcile_stats
+
+    rng = random.Random(SEED)
+    db.session.execute(
+        User.__table__.insert(),
+        [
+            {
+                "email": f"user{i}@bench.invalid",
+                "name": f"User {i}",
+                "is_admin": i == 1,
+            }
+            for i in range(1, n_users + 1)
+        ],
+    )
+    db.session.execute(
+        Subject.__table__.insert(),
+        [{"name": f"Subject {i:02d}"} for i in range(1, SUBJECTS + 1)],
+    )
+    db.session.execute(
+        NoteType.__table__.insert(), [{"name": "file"}, {"name": "link"}]
+    )
+
+    start = datetime(2024, 1, 1)
+    rows = []
+    for i in range(1, n_notes + 1):
+        kind = rng.choice(LINK_KINDS)
+        digest = f"{rng.getrandbits(256):064x}"
+        row = {
+            "title": f"Lecture {i} {rng.choice(['notes', 'slides', 'summary'])}",
+            "description": f"Week {i % 14 + 1} material for chapter {i % 9 + 1}",
+            "note_type_id": 2 if kind == "url" else 1,
+            "subject_id": rng.randint(1, SUBJECTS),
+            "user_id": rng.randint(1, n_users),
+            "created_at": start + timedelta(minutes=rng.randint(0, 525600)),
+            # executemany needs the same keys in every row.
+            "filename": None,
+            "thumbnail_key": None,
+            "preview_key": None,
+        }
+        if kind == "url":
+            url = f"https://example.com/{digest}"
+            row.update(link=url, original_link=url)
+        else:
+            row.update(
+                link=f"notes/sha256/{digest}.{kind}",
+                original_link=None,
+                filename=f"lecture-{i}.{kind}",
+            )
+            if kind == "png":
+                row["thumbnail_key"] = f"notes/sha256/{digest}.thumb.webp"
+                row["preview_key"] = f"notes/sha256/{digest}.preview.webp"
+        rows.append(row)
+        if len(rows) == SEED_CHUNK_SIZE:
+            db.session.execute(Note.__table__.insert(), rows)
+            rows = []
+    if rows:
+        db.session.execute(Note.__table__.insert(), rows)
+    db.session.commit()
+
+    ensure_search_index(rebuild=True)
+    reconcile_stats()
+    return [note_id for (note_id,) in db.session.query(Note.id)]
+
+
+def _percentile(sorted_values, pct):
+    index = min(len(sorted_values) - 1, round(pct / 100 * (len(sorted_values) - 1)))
+    return sorted_values[index]
+
+
+class _StatementCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, *args):
+        self.count += 1
+
+
+def _measure(client, counter, request_for, iterations, warmup):
+    latencies, statements = [], []
+    for i in range(warmup + iterations):
+        method, url, data = request_for(i)
+        counter.count = 0
+        started = time.perf_counter()
+        response = client.open(url, method=method, data=data)
+        elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            raise RuntimeError(f"{method} {url} returned {response.status_code}")
+        if i >= warmup:
+            latencies.append(elapsed * 1000)
+            statements.append(counter.count)
+
+    # Tracing slows requests down, so peak memory gets a request of its own.
+    method, url, data = request_for(warmup + iterations)
+    tracemalloc.start()
+    client.open(url, method=method, data=data)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        "iterations": iterations,
+        "p50_ms": round(_percentile(latencies, 50), 3),
+        "p90_ms": round(_percentile(latencies, 90), 3),
+        "p99_ms": round(_percentile(latencies, 99), 3),
+        "mean_ms": round(sum(latencies) / len(latencies), 3),
+        "sql_statements": round(sum(statements) / len(statements), 1),
+        "peak_memory_kb": round(peak / 1024, 1),
+    }
+
+
+def _scenarios(note_ids, subject_ids):
+    # A unique query argument gives every request its own page-cache key, so
+    # the uncached variants measure the full render.
+    def uncached(path, **args):
+        def request_for(i):
+            query = "&".join(f"{k}={v}" for k, v in {**args, "_bench": i}.items())
+            return "GET", f"{path}?{query}", None
+
+        return request_for
+
+    def upload(i):
+        pdf = io.BytesIO(b"%PDF-1.4 benchmark " + str(i).encode() * 64)
+        return (
+            "POST",
+            "/notes/upload",
+            {
+                "title": f"Benchmark upload {i}",
+                "subject": str(subject_ids[i % len(subject_ids)]),
+                "note_type": "file",
+                "files": (pdf, f"bench-{i}.pdf"),
+            },
+        )
+
+    middle = note_ids[len(note_ids) // 2]
+    return {
+        "notes.list": uncached("/notes/list"),
+        "notes.list (cached)": lambda i: ("GET", "/notes/list", None),
+        "notes.list ?subject": uncached("/notes/list", subject=subject_ids[0]),
+        "notes.list ?search": uncached("/notes/list", search="summary"),
+        "notes.list ?after": uncached("/notes/list", after=middle),
+        "notes.preview": lambda i: (
+            "GET",
+            f"/notes/preview/{note_ids[(i * 7919) % len(note_ids)]}?_bench={i}",
+            None,
+        ),
+        "notes.upload": upload,
+        "admin.dashboard": lambda i: ("GET", "/admin/", None),
+    }
+
+
+def run_dataset(n_notes, iterations, warmup):
+    """Seed a fresh database with ``n_notes`` notes and benchmark every route."""
+    workdir = tempfile.mkdtemp(prefix="porahobe_bench_")
+    _configure_environment(workdir)
+    sys.path.insert(0, os.getcwd())
+
+    from sqlalchemy import event
+
+    import app.utilities.s3 as s3
+    from app import create_app
+    from app.extensions import db
+    from app.models import Subject
+    from benchmarks.fake_s3 import FakeS3
+
+    fake_s3 = FakeS3()
+    s3.get_s3_client = lambda: fake_s3
+
+    app = create_app()
+    app.config["TESTING"] = True
+    n_users = max(10, n_notes // NOTES_PER_USER)
+
+    with app.app_context():
+        db.create_all()
+        started = time.perf_counter()
+        note_ids = seed(n_notes, n_users)
+        seed_seconds = time.perf_counter() - started
+        subject_ids = [subject_id for (subject_id,) in db.session.query(Subject.id)]
+        counter = _StatementCounter()
+        for engine in db.engines.values():
+            event.listen(engine, "before_cursor_execute", counter)
+
+    client = app.test_client()
+    login(client, 1)
+
+    routes = {}
+    for name, request_for in _scenarios(note_ids, subject_ids).items():
+        routes[name] = _measure(client, counter, request_for, iterations, warmup)
+        p50 = routes[name]["p50_ms"]
+        print(f"  {n_notes:>7} notes  {name:<22} p50 {p50:8.2f} ms", flush=True)
+
+    return {
+        "notes": n_notes,
+        "users": n_users,
+        "subjects": SUBJECTS,
+        "seed_seconds": round(seed_seconds, 2),
+        # Linux reports kilobytes.
+        "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        "routes": routes,
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(before_path, after_path):
+    with open(before_path) as f:
+        before = {run["notes"]: run for run in json.load(f)["runs"]}
+    with open(after_path) as f:
+        after = json.load(f)
+
+    print(f"{'notes':>7}  {'route':<22} {'p50 ms':>17} {'change':>8} {'SQL':>11}")
+    for run in after["runs"]:
+        old_run = before.get(run["notes"])
+        if old_run is None:
+            continue
+        for name, new in run["routes"].items():
+            old = old_run["routes"].get(name)
+            if old is None:
+                continue
+            change = (new["p50_ms"] - old["p50_ms"]) / old["p50_ms"] * 100
+            print(
+                f"{run['notes']:>7}  {name:<22} "
+                f"{old['p50_ms']:>8.2f}→{new['p50_ms']:<8.2f} {change:>+7.1f}% "
+                f"{old['sql_statements']:>5}→{new['sql_statements']:<5}"
+            )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--notes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--warmup", type=int, default=5)
+    parser.add_argument("--output", default="bench.json")
+    parser.add_argument(
+        "--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Diff two results."
+    )
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    # One process per dataset: module-level caches and peak RSS start clean.
+    context = multiprocessing.get_context("spawn")
+    runs = []
+    for n_notes in args.notes:
+        with context.Pool(1) as pool:
+            runs.append(
+                pool.apply(run_dataset, (n_notes, args.iterations, args.warmup))
+            )
+
+    results = {
+        "commit": _git_commit(),
+        "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "iterations": args.iterations,
+        "warmup": args.warmup,
+        "runs": runs,
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
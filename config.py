@@ -58,12 +58,35 @@ def _default_database_uri():
     return "sqlite:///instance/app.db"
 
 
+def _is_sqlite_file(uri):
+    scheme, _, path = uri.partition(":///")
+    return scheme in ("sqlite", "sqlite+pysqlite") and path not in ("", ":memory:")
+
+
 class Config:
     SECRET_KEY = os.environ.get("SECRET_KEY") or "dev-secret-key"
 
     SQLALCHEMY_DATABASE_URI = _default_database_uri()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
+    # Local SQLite engine profile (ignored for sqlitecloud). Every connection
+    # runs in WAL mode with these pragmas; writes start with BEGIN IMMEDIATE and
+    # are serialized within each worker, waiting up to SQLITE_BUSY_TIMEOUT_MS
+    # for other workers. synchronous=NORMAL is safe under WAL: a power loss can
+    # drop the last commits but cannot corrupt the database.
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get("SQLITE_BUSY_TIMEOUT_MS", 10000))
+    SQLITE_SYNCHRONOUS = os.environ.get("SQLITE_SYNCHRONOUS", "NORMAL")
+    SQLITE_MMAP_SIZE = int(os.environ.get("SQLITE_MMAP_SIZE", 256 * 1024 * 1024))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get("SQLITE_CACHE_SIZE_KB", 16 * 1024))
+    # GET and HEAD requests read through a second, query-only connection pool
+    # on the same file, so page loads never queue behind the writer.
+    SQLITE_READ_POOL = os.environ.get("SQLITE_READ_POOL", "1") == "1"
+    SQLALCHEMY_BINDS = (
+        {"sqlite_reader": SQLALCHEMY_DATABASE_URI}
+        if SQLITE_READ_POOL and _is_sqlite_file(SQLALCHEMY_DATABASE_URI)
+        else {}
+    )
+
     # Google OAuth
     GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_CLIENT_SECRET")
     GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_CLIENT_ID")
@@ -74,12 +97,90 @@ class Config:
     DISCORD_BOT_TOKEN = os.environ.get("DISCORD_BOT_TOKEN")
     DISCORD_GUILD_ID = os.environ.get("DISCORD_GUILD_ID")
     DISCORD_WEBHOOK_URL = os.environ.get("DISCORD_WEBHOOK_URL")
+    # Webhook embeds are queued in a local SQLite outbox and sent by a
+    # background dispatcher, so uploads never wait on Discord.
+    WEBHOOK_OUTBOX_PATH = os.environ.get("WEBHOOK_OUTBOX_PATH") or (
+        "/data/webhook_outbox.db" if os.path.isdir("/data") else "instance/webhook_outbox.db"
+    )
+    WEBHOOK_POLL_INTERVAL = float(os.environ.get("WEBHOOK_POLL_INTERVAL", 30))
 
     # S3 Storage Configuration
     S3_BUCKET_NAME = os.environ.get("S3_BUCKET_NAME")
     S3_ENDPOINT_URL = os.environ.get("S3_ENDPOINT")
     S3_SECRET_KEY = os.environ.get("S3_SECRET_KEY")
     S3_ACCESS_KEY_ID = os.environ.get("S3_ACCESS_KEY_ID")
+    # Uploads are streamed in parts of this size, which is also the per-upload
+    # memory ceiling; anything smaller goes up as a single PUT.
+    S3_MULTIPART_PART_SIZE = int(
+        os.environ.get("S3_MULTIPART_PART_SIZE", 8 * 1024 * 1024)
+    )
+    # Concurrent S3 uploads per multi-file submission.
+    S3_UPLOAD_WORKERS = int(os.environ.get("S3_UPLOAD_WORKERS", 4))
+    # Keep-alive connections in each worker's shared S3 client; sized for
+    # request threads plus the upload pool.
+    S3_MAX_POOL_CONNECTIONS = int(os.environ.get("S3_MAX_POOL_CONNECTIONS", 20))
+    # Seconds an unreferenced object waits before it is deleted, so an upload
+    # of the same content in flight has time to index it again.
+    S3_DELETE_DELAY_SECONDS = int(os.environ.get("S3_DELETE_DELAY_SECONDS", 60))
+
+    # Caching. SHARED_CACHE_PATH is a local SQLite file that lets every gunicorn
+    # worker reuse the same entries; set it empty to keep caches per process.
+    SHARED_CACHE_PATH = os.environ.get("SHARED_CACHE_PATH", "instance/shared_cache.db")
+    PRESIGNED_URL_CACHE_SIZE = int(os.environ.get("PRESIGNED_URL_CACHE_SIZE", 4096))
+    # Rendered note pages per worker. Keep the TTL well under the presigned URL
+    # reuse margin (app.utilities.s3.PRESIGNED_URL_MIN_REMAINING).
+    PAGE_CACHE_SIZE = int(os.environ.get("PAGE_CACHE_SIZE", 512))
+    PAGE_CACHE_TTL = int(os.environ.get("PAGE_CACHE_TTL", 60))
+    # Logged-in users per worker; role and profile changes invalidate at once,
+    # the TTL only bounds how long an unchanged row is trusted.
+    USER_CACHE_SIZE = int(os.environ.get("USER_CACHE_SIZE", 1024))
+    USER_CACHE_TTL = int(os.environ.get("USER_CACHE_TTL", 60))
+
+    # Pagination
+    NOTES_PER_PAGE = int(os.environ.get("NOTES_PER_PAGE", 30))
+    ADMIN_NOTES_PER_PAGE = int(os.environ.get("ADMIN_NOTES_PER_PAGE", 50))
+
+    # Per-request SQL statement budget; 0 disables the check. Exceeding it logs a
+    # warning, or raises when strict mode or app.testing is on.
+    SQL_QUERY_BUDGET = int(os.environ.get("SQL_QUERY_BUDGET", 20))
+    SQL_QUERY_BUDGET_STRICT = os.environ.get("SQL_QUERY_BUDGET_STRICT", "0") == "1"
+
+    # Largest Google Drive file that will be copied into S3.
+    DRIVE_IMPORT_MAX_BYTES = int(
+        os.environ.get("DRIVE_IMPORT_MAX_BYTES", 500 * 1024 * 1024)
+    )
+
+    # Originals larger than this are not downloaded to build image thumbnails.
+    THUMBNAIL_MAX_SOURCE_BYTES = int(
+        os.environ.get("THUMBNAIL_MAX_SOURCE_BYTES", 50 * 1024 * 1024)
+    )
+
+    # Per-request SQL/S3/HTTP/template timings in a Server-Timing header, and a
+    # warning with that breakdown for requests slower than SLOW_REQUEST_MS.
+    SERVER_TIMING_ENABLED = os.environ.get("SERVER_TIMING_ENABLED", "1") == "1"
+    SLOW_REQUEST_MS = int(os.environ.get("SLOW_REQUEST_MS", 1000))
+
+    # Prometheus metrics at /metrics. Each worker adds its counts to this local
+    # SQLite file every METRICS_FLUSH_INTERVAL seconds, so a scrape of any worker
+    # sees the sum of all of them; set it empty to turn metrics off. With
+    # METRICS_TOKEN set, scrapes need "Authorization: Bearer <token>".
+    METRICS_DB_PATH = os.environ.get("METRICS_DB_PATH", "instance/metrics.db")
+    METRICS_FLUSH_INTERVAL = float(os.environ.get("METRICS_FLUSH_INTERVAL", 5))
+    METRICS_TOKEN = os.environ.get("METRICS_TOKEN")
+
+    # Drive links are copied into S3 by a background worker. It runs as a thread
+    # in each web worker unless disabled, in which case run `flask imports worker`.
+    IMPORT_WORKER_IN_PROCESS = os.environ.get("IMPORT_WORKER_IN_PROCESS", "1") == "1"
+    IMPORT_WORKER_POLL_INTERVAL = float(
+        os.environ.get("IMPORT_WORKER_POLL_INTERVAL", 10)
+    )
+
+    # Seconds between background recounts of the admin dashboard statistics;
+    # 0 disables the in-process job (use `flask stats reconcile` instead).
+    STATS_RECONCILE_INTERVAL = int(os.environ.get("STATS_RECONCILE_INTERVAL", 3600))
+
+    # Database export: rows fetched per query for the NDJSON dump.
+    EXPORT_BATCH_SIZE = int(os.environ.get("EXPORT_BATCH_SIZE", 1000))
 
     # Admin
     ADMIN_SECRET_CODE = os.environ.get("ADMIN_SECRET_CODE") or "admin123"
@@ -0,0 +1,93 @@
+"""Baseline schema
+
+Revision ID: 0001_baseline
+Revises:
+Create Date: 2026-10-18 00:00:00
+
+Databases created with db.create_all() before migrations existed already have
+these tables, so each one is only created when missing.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0001_baseline"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "user" not in existing:
+        op.create_table(
+            "user",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("email", sa.String(length=120), nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.Column("is_admin", sa.Boolean(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("email"),
+        )
+
+    if "subject" not in existing:
+        op.create_table(
+            "subject",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=100), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+        )
+
+    if "note_type" not in existing:
+        op.create_table(
+            "note_type",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(length=50), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("name"),
+        )
+
+    if "flask_dance_oauth" not in existing:
+        op.create_table(
+            "flask_dance_oauth",
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("provider_user_id", sa.String(length=256), nullable=False),
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("provider", sa.String(length=50), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("token", sa.JSON(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint(
+                "provider", "provider_user_id", name="uq_oauth_provider_user"
+            ),
+        )
+
+    if "note" not in existing:
+        op.create_table(
+            "note",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("title", sa.String(length=200), nullable=False),
+            sa.Column("description", sa.Text(), nullable=True),
+            sa.Column("link", sa.String(length=500), nullable=True),
+            sa.Column("original_link", sa.String(length=500), nullable=True),
+            sa.Column("note_type_id", sa.Integer(), nullable=False),
+            sa.Column("subject_id", sa.Integer(), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["note_type_id"], ["note_type.id"]),
+            sa.ForeignKeyConstraint(["subject_id"], ["subject.id"]),
+            sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+            sa.PrimaryKeyConstraint("id"),
+        )
+
+
+def downgrade():
+    op.drop_table("note")
+    op.drop_table("flask_dance_oauth")
+    op.drop_table("note_type")
+    op.drop_table("subject")
+    op.drop_table("user")
@@ -0,0 +1,37 @@
+"""Composite indexes for note listings and OAuth lookups
+
+Revision ID: 0002_note_indexes
+Revises: 0001_baseline
+Create Date: 2026-10-18 00:00:00
+
+The (provider, provider_user_id) lookup in _finish_login is already served by
+the uq_oauth_provider_user unique index; ix_oauth_user_provider covers the
+per-user provider lookups.
+"""
+
+from alembic import op
+
+
+revision = "0002_note_indexes"
+down_revision = "0001_baseline"
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ("ix_note_created_at", "note", ["created_at"]),
+    ("ix_note_title", "note", ["title"]),
+    ("ix_note_subject_created", "note", ["subject_id", "created_at"]),
+    ("ix_note_user_created", "note", ["user_id", "created_at"]),
+    ("ix_note_note_type_created", "note", ["note_type_id", "created_at"]),
+    ("ix_oauth_user_provider", "flask_dance_oauth", ["user_id", "provider"]),
+]
+
+
+def upgrade():
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade():
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,45 @@
+"""Background import jobs for Drive links
+
+Revision ID: 0003_import_jobs
+Revises: 0002_note_indexes
+Create Date: 2026-10-18 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0003_import_jobs"
+down_revision = "0002_note_indexes"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "import_job",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("note_id", sa.Integer(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=False),
+        sa.Column("source_url", sa.String(length=500), nullable=False),
+        sa.Column("status", sa.String(length=20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("bytes_done", sa.BigInteger(), nullable=False),
+        sa.Column("bytes_total", sa.BigInteger(), nullable=True),
+        sa.Column("error", sa.Text(), nullable=True),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+        sa.ForeignKeyConstraint(["note_id"], ["note.id"]),
+        sa.ForeignKeyConstraint(["user_id"], ["user.id"]),
+        sa.PrimaryKeyConstraint("id"),
+        if_not_exists=True,
+    )
+    op.create_index(
+        "ix_import_job_status_id", "import_job", ["status", "id"], if_not_exists=True
+    )
+
+
+def downgrade():
+    op.drop_index("ix_import_job_status_id", table_name="import_job")
+    op.drop_table("import_job")
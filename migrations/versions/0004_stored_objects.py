@@ -0,0 +1,42 @@
+"""Content-addressed stored objects
+
+Revision ID: 0004_stored_objects
+Revises: 0003_import_jobs
+Create Date: 2026-10-18 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0004_stored_objects"
+down_revision = "0003_import_jobs"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "stored_object",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("sha256", sa.String(length=64), nullable=False),
+        sa.Column("key", sa.String(length=500), nullable=False),
+        sa.Column("size", sa.BigInteger(), nullable=False),
+        sa.Column("content_type", sa.String(length=255), nullable=False),
+        sa.Column("ref_count", sa.Integer(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("key"),
+        sa.UniqueConstraint("sha256"),
+        if_not_exists=True,
+    )
+
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("note")}
+    if "filename" not in columns:
+        op.add_column("note", sa.Column("filename", sa.String(length=255), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("note") as batch_op:
+        batch_op.drop_column("filename")
+    op.drop_table("stored_object")
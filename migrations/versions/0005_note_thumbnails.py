@@ -0,0 +1,28 @@
+"""Thumbnail and preview image keys on notes
+
+Revision ID: 0005_note_thumbnails
+Revises: 0004_stored_objects
+Create Date: 2026-10-18 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0005_note_thumbnails"
+down_revision = "0004_stored_objects"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    columns = {c["name"] for c in sa.inspect(op.get_bind()).get_columns("note")}
+    for name in ("thumbnail_key", "preview_key"):
+        if name not in columns:
+            op.add_column("note", sa.Column(name, sa.String(length=500), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table("note") as batch_op:
+        batch_op.drop_column("preview_key")
+        batch_op.drop_column("thumbnail_key")
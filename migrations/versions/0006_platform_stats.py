@@ -0,0 +1,32 @@
+"""Incrementally maintained dashboard statistics
+
+Revision ID: 0006_platform_stats
+Revises: 0005_note_thumbnails
+Create Date: 2026-10-18 00:00:00
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0006_platform_stats"
+down_revision = "0005_note_thumbnails"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Rows are filled by the first reconciliation (the background reconciler
+    # or `flask stats reconcile`).
+    op.create_table(
+        "platform_stat",
+        sa.Column("scope", sa.String(length=20), nullable=False),
+        sa.Column("key", sa.String(length=64), nullable=False),
+        sa.Column("value", sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint("scope", "key"),
+        if_not_exists=True,
+    )
+
+
+def downgrade():
+    op.drop_table("platform_stat")
@@ -0,0 +1,54 @@
+"""Full-text search index for notes
+
+Revision ID: 0007_note_search_index
+Revises: 0006_platform_stats
+Create Date: 2026-10-18 00:00:00
+
+Creates and backfills the note_fts FTS5 table on SQLite. Other databases, and
+SQLite builds without FTS5, keep using LIKE search. `flask search rebuild`
+rebuilds the index from the note table at any time.
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+revision = "0007_note_search_index"
+down_revision = "0006_platform_stats"
+branch_labels = None
+depends_on = None
+
+FTS_DIALECTS = {"sqlite", "sqlitecloud"}
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name not in FTS_DIALECTS:
+        return
+
+    fts5 = sa.text("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+    if not bind.execute(fts5).scalar():
+        # SQLite build without FTS5; search falls back to LIKE.
+        return
+
+    op.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS note_fts USING fts5("
+        "title, description, subject, note_type, "
+        "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+    )
+    op.execute("DELETE FROM note_fts")
+
+    op.execute(
+        "INSERT INTO note_fts(rowid, title, description, subject, note_type) "
+        "SELECT note.id, note.title, COALESCE(note.description, ''), "
+        "COALESCE(subject.name, ''), COALESCE(note_type.name, '') "
+        "FROM note "
+        "LEFT JOIN subject ON subject.id = note.subject_id "
+        "LEFT JOIN note_type ON note_type.id = note.note_type_id"
+    )
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name in FTS_DIALECTS:
+        op.execute("DROP TABLE IF EXISTS note_fts")
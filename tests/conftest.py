@@ -0,0 +1,104 @@
+import os
+import tempfile
+from datetime import datetime, timedelta
+
+import pytest
+
+# Config reads the environment on import, so point everything at a scratch
+# directory before the app is imported.
+_tmp = tempfile.mkdtemp(prefix="porahobe-tests-")
+os.environ.update(
+    {
+        "DATABASE_URL": f"sqlite:///{_tmp}/app.db",
+        "METRICS_DB_PATH": f"{_tmp}/metrics.db",
+        "WEBHOOK_OUTBOX_PATH": f"{_tmp}/webhooks.db",
+        "IMPORT_WORKER_IN_PROCESS": "0",
+        "STATS_RECONCILE_INTERVAL": "0",
+        "S3_DELETE_DELAY_SECONDS": "0",
+        "S3_BUCKET_NAME": "test-bucket",
+        "S3_ENDPOINT": "http://localhost:9000",
+        "S3_ACCESS_KEY_ID": "test",
+        "S3_SECRET_KEY": "test",
+        "GOOGLE_CLIENT_ID": "test",
+        "GOOGLE_CLIENT_SECRET": "test",
+        "DISCORD_CLIENT_ID": "test",
+        "DISCORD_CLIENT_SECRET": "test",
+    }
+)
+
+from app import create_app  # noqa: E402
+from app.extensions import db  # noqa: E402
+from app.models import Note, NoteType, Subject, User  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def app():
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+@pytest.fixture
+def database(app, tmp_path):
+    # A fresh shared cache per test starts every version token anew, so no
+    # cached page or reference data survives into the next test.
+    app.config["SHARED_CACHE_PATH"] = str(tmp_path / "shared_cache.db")
+    with app.app_context():
+        db.drop_all()
+        db.create_all()
+        yield db
+        db.session.remove()
+
+
+@pytest.fixture
+def records(database):
+    """Two users, two subjects and a note type; ids are returned by name."""
+    admin = User(email="admin@example.com", name="Admin", is_admin=True)
+    user = User(email="user@example.com", name="User")
+    maths = Subject(name="Maths")
+    physics = Subject(name="Physics")
+    link = NoteType(name="link")
+    database.session.add_all([admin, user, maths, physics, link])
+    database.session.commit()
+    return {
+        "admin": admin.id,
+        "user": user.id,
+        "maths": maths.id,
+        "physics": physics.id,
+        "link": link.id,
+    }
+
+
+@pytest.fixture
+def client(app, records):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = str(records["user"])
+        session["_fresh"] = True
+    return client
+
+
+@pytest.fixture
+def add_notes(database, records):
+    """Add ``count`` link notes an hour apart, oldest first; returns their ids."""
+
+    def add_notes(count, **values):
+        base = datetime(2024, 1, 1)
+        notes = [
+            Note(
+                title=f"Note {i}",
+                link=f"https://example.com/{i}",
+                original_link=f"https://example.com/{i}",
+                note_type_id=records["link"],
+                subject_id=records["maths"],
+                user_id=records["user"],
+                created_at=base + timedelta(hours=i),
+                **values,
+            )
+            for i in range(count)
+        ]
+        database.session.add_all(notes)
+        database.session.commit()
+        return [note.id for note in notes]
+
+    return add_notes
@@ -0,0 +1,30 @@
+from app.models import Note
+
+
+def test_conditional_get_returns_not_modified(client, add_notes):
+    add_notes(2)
+
+    first = client.get("/notes/list")
+    assert first.status_code == 200
+    assert first.headers["ETag"]
+    assert "no-cache" in first.headers["Cache-Control"]
+
+    again = client.get("/notes/list", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+
+
+def test_commit_invalidates_cached_pages(client, add_notes, database):
+    ids = add_notes(2)
+    first = client.get("/notes/list")
+    assert b"Renamed note" not in first.data
+
+    database.session.get(Note, ids[0]).title = "Renamed note"
+    database.session.commit()
+
+    response = client.get(
+        "/notes/list", headers={"If-None-Match": first.headers["ETag"]}
+    )
+    assert response.status_code == 200
+    assert b"Renamed note" in response.data
+    assert response.headers["ETag"] != first.headers["ETag"]
@@ -0,0 +1,49 @@
+from app.models import Note
+from app.utilities.pagination import paginate_notes
+
+
+def _walk(app, **cursor):
+    with app.test_request_context("/notes/list"):
+        page = paginate_notes(Note.query, "newest", per_page=2, **cursor)
+        return [note.id for note in page.items], page
+
+
+def test_cursor_round_trip(app, add_notes):
+    ids = add_notes(5)
+
+    pages, cursor = [], {}
+    while True:
+        items, page = _walk(app, **cursor)
+        pages.append(items)
+        if page.next_cursor is None:
+            break
+        cursor = {"after": str(page.next_cursor)}
+
+    assert pages == [ids[4:2:-1], ids[2:0:-1], ids[:1]]
+
+    # Walking back from the last page revisits the same pages in reverse.
+    back = []
+    while page.prev_cursor is not None:
+        items, page = _walk(app, before=str(page.prev_cursor))
+        back.append(items)
+    assert back == pages[-2::-1]
+
+
+def test_invalid_cursor_is_ignored(app, add_notes):
+    ids = add_notes(3)
+
+    items, page = _walk(app, after="not-a-number")
+
+    assert items == [ids[2], ids[1]]
+    assert page.prev_cursor is None
+
+
+def test_stale_cursor_redirects_to_first_page(client, add_notes, database):
+    ids = add_notes(3)
+    database.session.delete(database.session.get(Note, ids[0]))
+    database.session.commit()
+
+    response = client.get(f"/notes/list?subject=1&after={ids[0]}")
+
+    assert response.status_code == 302
+    assert response.location == "/notes/list?subject=1"
@@ -0,0 +1,58 @@
+from app.models import Note, PlatformStat
+from app.utilities.stats import (
+    META,
+    STATS,
+    _actual_counts,
+    count_bulk_note_change,
+    reconcile_stats,
+)
+
+
+def _stored_counts():
+    return {
+        (row.scope, row.key): row.value
+        for row in PlatformStat.query.filter(PlatformStat.scope != META)
+        if row.value
+    }
+
+
+def _assert_counts_match():
+    actual = {key: value for key, value in _actual_counts().items() if value}
+    assert _stored_counts() == actual
+
+
+def test_flushes_update_counts(database, records, add_notes):
+    reconcile_stats()
+    ids = add_notes(3)
+    _assert_counts_match()
+
+    note = database.session.get(Note, ids[0])
+    note.subject_id = records["physics"]
+    note.user_id = records["admin"]
+    database.session.commit()
+    _assert_counts_match()
+
+    database.session.delete(database.session.get(Note, ids[1]))
+    database.session.commit()
+    _assert_counts_match()
+
+
+def test_bulk_changes_update_counts(database, records, add_notes):
+    reconcile_stats()
+    ids = add_notes(4)
+
+    moved = Note.id.in_(ids[:2])
+    count_bulk_note_change(moved, {Note.subject_id: records["physics"]})
+    Note.query.filter(moved).execution_options(changes_counted=(STATS,)).update(
+        {Note.subject_id: records["physics"]}, synchronize_session=False
+    )
+    database.session.commit()
+    _assert_counts_match()
+
+    deleted = Note.id.in_(ids[1:3])
+    count_bulk_note_change(deleted)
+    Note.query.filter(deleted).execution_options(changes_counted=(STATS,)).delete(
+        synchronize_session=False
+    )
+    database.session.commit()
+    _assert_counts_match()
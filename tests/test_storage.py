@@ -0,0 +1,69 @@
+import pytest
+
+from app.models import StoredObject
+from app.utilities.storage import (
+    ContentReleased,
+    StoredFile,
+    derivative_key,
+    release_objects,
+    retain_object,
+    retain_objects,
+)
+
+DIGEST = "ab" * 32
+KEY = f"notes/sha256/{DIGEST}.pdf"
+
+
+def _uploaded():
+    return StoredFile(DIGEST, KEY, 3, "application/pdf", True)
+
+
+def _reused():
+    return StoredFile(DIGEST, KEY, 3, "application/pdf", False)
+
+
+def _ref_count():
+    stored = StoredObject.query.filter_by(sha256=DIGEST).first()
+    return stored.ref_count if stored else None
+
+
+def test_retain_and_release_count_references(database):
+    assert retain_object(_uploaded()) == KEY
+    assert retain_object(_reused()) == KEY
+    database.session.commit()
+    assert _ref_count() == 2
+
+    assert release_objects([KEY]) == []
+    database.session.commit()
+    assert _ref_count() == 1
+
+    orphaned = release_objects([KEY])
+    database.session.commit()
+    assert orphaned[0] == KEY
+    assert derivative_key(KEY, "thumb") in orphaned
+    assert _ref_count() is None
+
+
+def test_batched_retain_and_release(database):
+    keys = retain_objects([_uploaded(), _reused(), _reused()])
+    database.session.commit()
+    assert keys == {DIGEST: KEY}
+    assert _ref_count() == 3
+
+    assert release_objects([KEY, KEY, None]) == []
+    database.session.commit()
+    assert _ref_count() == 1
+
+
+def test_release_ignores_unindexed_keys(database):
+    assert release_objects(["https://example.com/file", "legacy/key.pdf"]) == []
+
+
+def test_reused_object_released_meanwhile(database):
+    retain_object(_uploaded())
+    database.session.commit()
+    release_objects([KEY])
+    database.session.commit()
+
+    with pytest.raises(ContentReleased):
+        retain_object(_reused())